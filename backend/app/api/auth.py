@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from beanie import PydanticObjectId
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
 from typing import Optional
 from ..core.security import (
     create_access_token,
     create_refresh_token,
-    verify_password,
-    get_password_hash,
+    create_reset_token,
+    averify_password,
+    aget_password_hash,
     verify_token
 )
-from ..db.session import get_db
-from ..models.user import User
+from ..core.auth import invalidate_user, token_user
+from ..models.mongodb import User
 from ..schemas.auth import (
     Token,
     UserCreate,
@@ -20,39 +22,44 @@ from ..schemas.auth import (
     PasswordReset
 )
 from ..core.config import settings
-from ..services.email import send_password_reset_email
+from ..services.email import password_reset_email
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
+async def register(user: UserCreate):
+    already_registered = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered"
+    )
+    if await User.find_one(User.email == user.email):
+        raise already_registered
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await aget_password_hash(user.password)
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
         full_name=user.full_name,
-        role=user.role
+        role=user.role.value
+    )
+    try:
+        await db_user.insert()
+    except DuplicateKeyError:
+        # Registered concurrently; email_unique caught it
+        raise already_registered
+    return UserResponse(
+        id=str(db_user.id),
+        email=db_user.email,
+        full_name=db_user.full_name,
+        role=db_user.role,
+        is_active=db_user.is_active
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
 
 @router.post("/login", response_model=Token)
-async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
-):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await User.find_one(User.email == form_data.username)
+    if not user or not await averify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -69,12 +76,18 @@ async def login(
 
 @router.post("/refresh", response_model=Token)
 async def refresh_token(token: str = Depends(oauth2_scheme)):
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token"
+    )
     payload = verify_token(token)
-    if not payload or payload.get("type") != "refresh":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token"
-        )
+    if not payload or payload.get("type") != "refresh" or not payload.get("sub"):
+        raise invalid_token
+    
+    # Refresh tokens are revoked like access tokens: deactivating the user
+    # or changing the password ends the session
+    if not await token_user(payload):
+        raise invalid_token
     
     access_token = create_access_token(data={"sub": payload.get("sub")})
     return {
@@ -83,43 +96,45 @@ async def refresh_token(token: str = Depends(oauth2_scheme)):
     }
 
 @router.post("/forgot-password")
-async def forgot_password(
-    request: PasswordResetRequest,
-    db: Session = Depends(get_db)
-):
-    user = db.query(User).filter(User.email == request.email).first()
+async def forgot_password(request: PasswordResetRequest):
+    user = await User.find_one(User.email == request.email)
     if user:
-        reset_token = create_access_token(
-            data={"sub": str(user.id)},
-            expires_delta=timedelta(hours=1)
-        )
-        user.reset_password_token = reset_token
-        db.commit()
-        await send_password_reset_email(user.email, reset_token)
+        reset_token = create_reset_token(data={"sub": str(user.id)})
+        await user.set({User.reset_password_token: reset_token})
+        # Delivered by the workers; the request only enqueues. Imported
+        # here so the auth API does not load every task module on import
+        from ..tasks import queue_emails
+        queue_emails([password_reset_email(user.email, reset_token)])
     
     return {"message": "If your email is registered, you will receive a password reset link"}
 
 @router.post("/reset-password")
-async def reset_password(
-    request: PasswordReset,
-    db: Session = Depends(get_db)
-):
+async def reset_password(request: PasswordReset):
+    invalid_token = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid or expired token"
+    )
     payload = verify_token(request.token)
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or expired token"
-        )
+    if not payload or payload.get("type") != "reset" or not PydanticObjectId.is_valid(payload.get("sub")):
+        raise invalid_token
     
-    user = db.query(User).filter(User.id == payload.get("sub")).first()
-    if not user or user.reset_password_token != request.token:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or expired token"
-        )
+    hashed_password = await aget_password_hash(request.new_password)
+    now = datetime.utcnow()
+    # Matching on the stored token makes every reset link single-use
+    result = await User.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(payload["sub"]), "reset_password_token": request.token},
+        {"$set": {
+            "hashed_password": hashed_password,
+            "reset_password_token": None,
+            "password_changed_at": now,
+            "updated_at": now
+        }}
+    )
+    if not result.matched_count:
+        raise invalid_token
     
-    user.hashed_password = get_password_hash(request.new_password)
-    user.reset_password_token = None
-    db.commit()
+    # Revoke cached sessions everywhere; get_current_user reads the same
+    # password_changed_at
+    await invalidate_user(payload["sub"])
     
     return {"message": "Password has been reset successfully"} 
\ No newline at end of file
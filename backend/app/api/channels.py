@@ -1,14 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from beanie import PydanticObjectId
+from pymongo import DESCENDING
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
 from ..models.channel import Channel
+from ..models.mongodb import Channel as ChannelDocument
 from ..schemas.channel import (
     ChannelCreate,
     ChannelResponse,
     ChannelUpdate,
-    ChannelStats
+    ChannelStats,
+    ChannelListItem,
+    ChannelDetail,
+    ChannelPage,
+    CHANNEL_SUMMARY_FIELDS
 )
+from ..core.config import settings
 from ..core.database import get_db
+from ..core.conditional import (
+    DocumentVersion,
+    is_conditional,
+    make_etag,
+    not_modified,
+    validator_headers
+)
+from ..core.pagination import paginate, InvalidCursorError
+from ..core.projection import projection_model, select_fields, InvalidFieldsError
 from ..core.auth import get_current_user
 from ..models.user import User
 from ..services.telegram import telegram_service
@@ -63,34 +80,112 @@ async def create_channel(
     
     return db_channel
 
-@router.get("/", response_model=List[ChannelResponse])
+@router.get("/", response_model=ChannelPage, response_model_exclude_unset=True)
 async def list_channels(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    cursor: str = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    fields: str = None,
     current_user: User = Depends(get_current_user)
 ):
-    channels = db.query(Channel).filter(
-        Channel.owner_id == current_user.id
-    ).all()
-    return channels
+    """Channels, newest first, one page at a time.
+
+    `fields` selects ChannelListItem fields; the default is a summary.
+    """
+    try:
+        selected = select_fields(
+            fields,
+            ChannelListItem,
+            CHANNEL_SUMMARY_FIELDS,
+            ("id", "created_at", "updated_at")
+        )
+    except InvalidFieldsError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {e}"
+        )
+    
+    filters = [{"owner.$id": PydanticObjectId(current_user.id)}]
+    
+    if created_from or created_to:
+        window = {}
+        if created_from:
+            window["$gte"] = created_from
+        if created_to:
+            window["$lt"] = created_to
+        filters.append({"created_at": window})
+    
+    try:
+        channels, next_cursor = await paginate(
+            ChannelDocument,
+            filters,
+            "created_at",
+            limit,
+            cursor,
+            direction=DESCENDING,
+            projection=projection_model(ChannelListItem, selected)
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    etag = make_etag(
+        ",".join(sorted(selected)),
+        next_cursor,
+        *(f"{channel.id}@{channel.updated_at.isoformat()}" for channel in channels)
+    )
+    if not_modified(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=validator_headers(etag)
+        )
+    response.headers.update(validator_headers(etag))
+    
+    return ChannelPage(
+        items=[ChannelListItem.model_validate(channel) for channel in channels],
+        next_cursor=next_cursor
+    )
 
-@router.get("/{channel_id}", response_model=ChannelResponse)
+@router.get("/{channel_id}", response_model=ChannelDetail)
 async def get_channel(
-    channel_id: str,
-    db: Session = Depends(get_db),
+    channel_id: PydanticObjectId,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
-    channel = db.query(Channel).filter(
-        Channel.id == channel_id,
-        Channel.owner_id == current_user.id
-    ).first()
+    query = {"_id": channel_id, "owner.$id": PydanticObjectId(current_user.id)}
+    
+    if is_conditional(request):
+        version = await ChannelDocument.find_one(query).project(DocumentVersion)
+        if not version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Channel not found"
+            )
+        etag = make_etag(version.id, version.updated_at.isoformat())
+        if not_modified(request, etag, version.updated_at):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=validator_headers(etag, version.updated_at)
+            )
     
+    channel = await ChannelDocument.find_one(query)
     if not channel:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Channel not found"
         )
     
-    return channel
+    response.headers.update(validator_headers(
+        make_etag(channel.id, channel.updated_at.isoformat()),
+        channel.updated_at
+    ))
+    return ChannelDetail.model_validate(channel)
 
 @router.put("/{channel_id}", response_model=ChannelResponse)
 async def update_channel(
@@ -1,150 +1,131 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from beanie import PydanticObjectId
 from typing import List
 from datetime import datetime, timedelta
-from ..db.session import get_db
-from ..models.channel import TelegramChannel
-from ..models.post import Post
-from ..models.metrics import PostMetrics, ChannelMetrics
 from ..schemas.metrics import (
     ChannelMetricsResponse,
     PostMetricsResponse,
     MetricsTimeRange
 )
-from ..core.security import get_current_user
+from ..core.auth import get_current_user
+from ..core.cache import cached, channel_scope
+from ..core.config import settings
 from ..models.user import User
-from ..models.channel import Channel
+from ..models.mongodb import Channel, ChannelMetrics, Post
+from ..services.metrics_rollup import get_channel_totals
+from ..services import metrics_pipelines
 
 router = APIRouter()
 
 @router.get("/channels/{channel_id}/metrics", response_model=ChannelMetricsResponse)
 async def get_channel_metrics(
-    channel_id: int,
+    channel_id: PydanticObjectId,
     time_range: MetricsTimeRange = Depends(),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if channel exists and user is the owner
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = await Channel.get(channel_id)
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
-    if channel.owner_id != current_user.id:
+    if str(channel.owner.ref.id) != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to view metrics for this channel")
 
-    # Calculate time range
-    start_date = datetime.utcnow() - timedelta(days=time_range.days)
-
-    # Get metrics for all posts in the channel within the time range
-    posts_metrics = (
-        db.query(PostMetrics)
-        .join(Post)
-        .filter(
-            Post.channel_id == channel_id,
-            Post.created_at >= start_date
-        )
-        .all()
-    )
+    async def compute():
+        # Calculate time range
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=time_range.days)
 
-    # Calculate channel metrics
-    total_views = sum(metrics.views_count for metrics in posts_metrics)
-    total_shares = sum(metrics.shares_count for metrics in posts_metrics)
-    total_comments = sum(metrics.comments_count for metrics in posts_metrics)
-    total_ctr = sum(metrics.ctr for metrics in posts_metrics) if posts_metrics else 0
-
-    num_posts = len(posts_metrics)
-    average_views = total_views / num_posts if num_posts > 0 else 0
-    average_shares = total_shares / num_posts if num_posts > 0 else 0
-    average_comments = total_comments / num_posts if num_posts > 0 else 0
-    average_ctr = total_ctr / num_posts if num_posts > 0 else 0
-
-    # Calculate average engagement (likes + comments + shares) / views
-    total_engagement = sum(
-        metrics.likes_count + metrics.comments_count + metrics.shares_count
-        for metrics in posts_metrics
-    )
-    average_engagement = total_engagement / total_views if total_views > 0 else 0
-
-    return ChannelMetricsResponse(
-        subscribers_count=channel.subscribers_count,
-        views_count=total_views,
-        average_engagement=average_engagement,
-        average_views=average_views,
-        average_shares=average_shares,
-        average_comments=average_comments,
-        average_ctr=average_ctr
+        # Sum the pre-aggregated hourly/daily buckets instead of every post;
+        # channels without rollups yet are aggregated from the posts themselves
+        totals = await get_channel_totals(str(channel_id), start_date, end_date)
+        if not totals["posts"]:
+            totals = await metrics_pipelines.channel_totals(channel.id, start_date)
+
+        latest_metrics = await ChannelMetrics.find(
+            ChannelMetrics.channel.id == channel.id
+        ).sort(-ChannelMetrics.metric_date).first_or_none()
+
+        total_views = totals["views"]
+        num_posts = totals["posts"]
+        average_views = total_views / num_posts if num_posts > 0 else 0
+        average_shares = totals["shares"] / num_posts if num_posts > 0 else 0
+        average_comments = totals["comments"] / num_posts if num_posts > 0 else 0
+        average_ctr = totals["ctr_sum"] / num_posts if num_posts > 0 else 0
+
+        # Calculate average engagement (likes + comments + shares) / views
+        average_engagement = totals["engagement"] / total_views if total_views > 0 else 0
+
+        return ChannelMetricsResponse(
+            subscribers_count=latest_metrics.subscribers_count if latest_metrics else 0,
+            views_count=total_views,
+            average_engagement=average_engagement,
+            average_views=average_views,
+            average_shares=average_shares,
+            average_comments=average_comments,
+            average_ctr=average_ctr
+        ).model_dump(mode="json")
+
+    return await cached(
+        channel_scope(channel_id),
+        "metrics",
+        {"days": time_range.days},
+        compute,
+        ttl=settings.METRICS_CACHE_TTL_SECONDS,
+        stale_ttl=settings.METRICS_CACHE_STALE_SECONDS
     )
 
 @router.get("/posts/{post_id}/metrics", response_model=PostMetricsResponse)
 async def get_post_metrics(
-    post_id: int,
-    db: Session = Depends(get_db),
+    post_id: PydanticObjectId,
     current_user: User = Depends(get_current_user)
 ):
     # Check if post exists and user is the creator
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await Post.find_one({"_id": post_id, "author.$id": PydanticObjectId(current_user.id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    if post.channel.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to view metrics for this post")
 
-    # Get post metrics
-    metrics = db.query(PostMetrics).filter(PostMetrics.post_id == post_id).first()
-    if not metrics:
+    # The metrics tasks write the counters onto the post
+    if not post.metrics_recorded_at:
         raise HTTPException(status_code=404, detail="Metrics not found for this post")
 
     return PostMetricsResponse(
-        views_count=metrics.views_count,
-        likes_count=metrics.likes_count,
-        shares_count=metrics.shares_count,
-        comments_count=metrics.comments_count,
-        ctr=metrics.ctr,
+        views_count=post.views_count,
+        likes_count=post.likes_count,
+        shares_count=post.shares_count,
+        comments_count=post.comments_count,
+        ctr=post.ctr,
         created_at=post.created_at,
         updated_at=post.updated_at
     )
 
 @router.get("/channels/{channel_id}/top-posts", response_model=List[PostMetricsResponse])
 async def get_top_posts(
-    channel_id: int,
+    channel_id: PydanticObjectId,
     limit: int = 10,
     time_range: MetricsTimeRange = Depends(),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check if channel exists and user is the owner
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = await Channel.get(channel_id)
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found")
-    if channel.owner_id != current_user.id:
+    if str(channel.owner.ref.id) != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to view metrics for this channel")
 
-    # Calculate time range
-    start_date = datetime.utcnow() - timedelta(days=time_range.days)
-
-    # Get top posts by engagement (likes + comments + shares)
-    top_posts = (
-        db.query(Post, PostMetrics)
-        .join(PostMetrics)
-        .filter(
-            Post.channel_id == channel_id,
-            Post.created_at >= start_date
-        )
-        .order_by(
-            (PostMetrics.likes_count + PostMetrics.comments_count + PostMetrics.shares_count).desc()
-        )
-        .limit(limit)
-        .all()
-    )
+    async def compute():
+        # Calculate time range
+        start_date = datetime.utcnow() - timedelta(days=time_range.days)
+
+        # Get top posts by engagement (likes + comments + shares), ranked in Mongo
+        top_posts = await metrics_pipelines.top_posts(channel.id, start_date, limit)
 
-    return [
-        PostMetricsResponse(
-            views_count=metrics.views_count,
-            likes_count=metrics.likes_count,
-            shares_count=metrics.shares_count,
-            comments_count=metrics.comments_count,
-            ctr=metrics.ctr,
-            created_at=post.created_at,
-            updated_at=post.updated_at
-        )
-        for post, metrics in top_posts
-    ] 
\ No newline at end of file
+        return [PostMetricsResponse(**post).model_dump(mode="json") for post in top_posts]
+
+    return await cached(
+        channel_scope(channel_id),
+        "top-posts",
+        {"days": time_range.days, "limit": limit},
+        compute,
+        ttl=settings.METRICS_CACHE_TTL_SECONDS,
+        stale_ttl=settings.METRICS_CACHE_STALE_SECONDS
+    )
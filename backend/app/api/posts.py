@@ -1,26 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from beanie import PydanticObjectId
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
 from datetime import datetime
+import asyncio
+import json
+import logging
+import mimetypes
+import os
 from ..db.session import get_db
 from ..models.post import Post
+from ..models.mongodb import Post as PostDocument
 from ..models.user import User
 from ..schemas.post import (
     PostCreate,
     PostResponse,
     PostUpdate,
-    PostStatus
+    PostStatus,
+    GenerationJob,
+    BulkGenerationRequest,
+    PostImportReport,
+    PostListItem,
+    PostDetail,
+    PostPage,
+    POST_SUMMARY_FIELDS
 )
-from ..core.security import get_current_user
-from ..services.s3 import upload_to_s3
+from ..core.config import settings
+from ..core.conditional import (
+    DocumentVersion,
+    is_conditional,
+    make_etag,
+    not_modified,
+    validator_headers
+)
+from ..core.pagination import paginate, InvalidCursorError
+from ..core.projection import projection_model, select_fields, InvalidFieldsError
+from ..core.auth import get_current_user
+from ..services.gpt import stream_content
+from ..services.jobs import create_job, get_job, job_events
+from ..services.post_import import FORMATS as IMPORT_FORMATS, import_posts
+from ..services import scheduler
+from ..services.s3 import chunk_reader, upload_stream_to_s3, release_blob, UploadTooLargeError
 from ..tasks import (
     schedule_post,
-    generate_content,
-    generate_image
+    generate_post_content as generate_post_content_task,
+    generate_post_image as generate_post_image_task,
+    generate_content_bulk,
+    process_post_media
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+async def get_user_post(post_id: str, current_user: User) -> PostDocument:
+    post = None
+    if PydanticObjectId.is_valid(post_id):
+        post = await PostDocument.find_one({
+            "_id": PydanticObjectId(post_id),
+            "author.$id": PydanticObjectId(current_user.id)
+        })
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
+        )
+    return post
+
 @router.post("/", response_model=PostResponse)
 async def create_post(
     post: PostCreate,
@@ -56,27 +102,74 @@ async def create_post(
     
     return db_post
 
+@router.post("/import", response_model=PostImportReport)
+async def import_posts_file(
+    request: Request,
+    format: str = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Create posts from a CSV (with a header row) or NDJSON body.
+
+    The body is read as a stream and rows are validated and inserted in
+    batches, so memory use does not depend on the file size.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format, expected one of: {', '.join(IMPORT_FORMATS)}"
+        )
+    
+    # Imported posts are already scheduled: each batch goes straight into
+    # the schedule with one ZADD, and dispatch_due_posts publishes them
+    return await import_posts(request.stream(), fmt, str(current_user.id), scheduler.schedule_many)
+
 @router.post("/{post_id}/image")
 async def upload_post_image(
     post_id: str,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    request: Request,
+    filename: str = None,
     current_user: User = Depends(get_current_user)
 ):
-    post = db.query(Post).filter(
-        Post.id == post_id,
-        Post.created_by == current_user.id
-    ).first()
-    
-    if not post:
+    """Set the post image from the raw request body (Content-Type image/*).
+
+    The body is never spooled: oversized uploads are refused from their
+    Content-Length before anything is read, and the rest is streamed to S3.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Image must not exceed {settings.MAX_IMAGE_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if not content_type.startswith("image/"):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send the image itself as the request body with an image/* Content-Type"
         )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_IMAGE_UPLOAD_BYTES:
+        raise too_large
     
-    # Upload image to S3
-    image_data = await file.read()
-    image_url = upload_to_s3(image_data, f"posts/{post_id}/{file.filename}")
+    post = await get_user_post(post_id, current_user)
+    
+    # Stream the image to S3 without buffering it or blocking the loop;
+    # images seen before are not uploaded again
+    extension = (
+        os.path.splitext(filename or "")[1].lstrip(".").lower()
+        or (mimetypes.guess_extension(content_type) or "").lstrip(".")
+        or "bin"
+    )
+    name = os.path.basename(filename or "") or f"image.{extension}"
+    try:
+        image_url = await upload_stream_to_s3(
+            chunk_reader(request.stream()),
+            f"posts/{post_id}/{name}",
+            max_size=settings.MAX_IMAGE_UPLOAD_BYTES,
+            content_type=content_type,
+            extension=extension
+        )
+    except UploadTooLargeError:
+        raise too_large
     
     if not image_url:
         raise HTTPException(
@@ -84,111 +177,289 @@ async def upload_post_image(
             detail="Failed to upload image"
         )
     
-    # Update post with image URL
-    post.image_url = image_url
-    db.commit()
+    # Update post with image URL; the files it replaced are read in the
+    # same step, so concurrent uploads never release the same image twice
+    replaced = await PostDocument.get_motor_collection().find_one_and_update(
+        {"_id": post.id},
+        {"$set": {"image_url": image_url, "thumbnail_url": None, "updated_at": datetime.utcnow()}},
+        projection={"image_url": 1, "thumbnail_url": 1}
+    )
+    if replaced:
+        await asyncio.to_thread(release_blob, replaced.get("image_url"))
+        await asyncio.to_thread(release_blob, replaced.get("thumbnail_url"))
+    
+    # Resize, recompress and thumbnail in a worker
+    process_post_media.delay(post_id)
     
     return {"image_url": image_url}
 
-@router.post("/{post_id}/generate-content")
+@router.post(
+    "/{post_id}/generate-content",
+    response_model=GenerationJob,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def generate_post_content(
     post_id: str,
     prompt: str = None,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    post = db.query(Post).filter(
-        Post.id == post_id,
-        Post.created_by == current_user.id
-    ).first()
+    await get_user_post(post_id, current_user)
     
-    if not post:
+    # Generate content in a worker; it saves the result to the post
+    job = await create_job("content", current_user.id, post_id)
+    generate_post_content_task.apply_async(
+        args=[job["job_id"], post_id, prompt],
+        task_id=job["job_id"]
+    )
+    
+    return job
+
+@router.post(
+    "/generate-content/bulk",
+    response_model=GenerationJob,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def generate_posts_content_bulk(
+    request: BulkGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    if len(request.items) > settings.GPT_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.GPT_BULK_MAX_ITEMS} posts per request"
+        )
+    
+    post_ids = {item.post_id for item in request.items}
+    if not all(PydanticObjectId.is_valid(post_id) for post_id in post_ids):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
-    
-    # Generate content
-    content = generate_content.delay(prompt).get()
-    if not content:
+    owned = {
+        str(post.id) async for post in PostDocument.find({
+            "_id": {"$in": [PydanticObjectId(post_id) for post_id in post_ids]},
+            "author.$id": PydanticObjectId(current_user.id)
+        })
+    }
+    if owned != post_ids:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate content"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found"
         )
     
-    # Update post with generated content
-    post.content = content
-    db.commit()
+    # Progress is reported on the job and streamed by /jobs/{job_id}/events
+    job = await create_job("bulk-content", current_user.id, total=len(request.items))
+    generate_content_bulk.apply_async(
+        args=[job["job_id"], [item.model_dump() for item in request.items]],
+        task_id=job["job_id"]
+    )
     
-    return {"content": content}
+    return job
 
-@router.post("/{post_id}/generate-image")
+@router.post("/{post_id}/generate-content/stream")
+async def stream_post_content(
+    post_id: str,
+    request: Request,
+    prompt: str = None,
+    current_user: User = Depends(get_current_user)
+):
+    post = await get_user_post(post_id, current_user)
+    
+    async def event_stream():
+        tokens = stream_content(prompt)
+        parts = []
+        try:
+            async for token in tokens:
+                # Stop generating as soon as the client goes away
+                if await request.is_disconnected():
+                    return
+                parts.append(token)
+                yield f"event: token\ndata: {json.dumps({'text': token})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming content: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Failed to generate content'})}\n\n"
+            return
+        finally:
+            await tokens.aclose()
+        
+        content = "".join(parts).strip()
+        
+        try:
+            await PostDocument.get_motor_collection().update_one(
+                {"_id": post.id},
+                {"$set": {"content": content, "updated_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.error(f"Error saving streamed content for post {post_id}: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Failed to save content'})}\n\n"
+            return
+        
+        yield f"event: done\ndata: {json.dumps({'content': content})}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.post(
+    "/{post_id}/generate-image",
+    response_model=GenerationJob,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def generate_post_image(
     post_id: str,
     prompt: str = None,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    post = db.query(Post).filter(
-        Post.id == post_id,
-        Post.created_by == current_user.id
-    ).first()
+    await get_user_post(post_id, current_user)
     
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
+    # Generate image in a worker; it saves the result to the post
+    job = await create_job("image", current_user.id, post_id)
+    generate_post_image_task.apply_async(
+        args=[job["job_id"], post_id, prompt],
+        task_id=job["job_id"]
+    )
     
-    # Generate image
-    image_url = generate_image.delay(prompt or post.content).get()
-    if not image_url:
+    return job
+
+async def get_user_job(job_id: str, current_user: User) -> dict:
+    job = await get_job(job_id)
+    if not job or job["user_id"] != str(current_user.id):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate image"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
+    return job
+
+@router.get("/jobs/{job_id}", response_model=GenerationJob)
+async def get_generation_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    return await get_user_job(job_id, current_user)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    await get_user_job(job_id, current_user)
     
-    # Update post with generated image
-    post.image_url = image_url
-    db.commit()
+    async def event_stream():
+        async for job in job_events(job_id):
+            if job is None:
+                yield ": keepalive\n\n"
+                continue
+            payload = GenerationJob(**job).model_dump_json()
+            yield f"event: {job['status']}\ndata: {payload}\n\n"
     
-    return {"image_url": image_url}
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
-@router.get("/", response_model=List[PostResponse])
+@router.get("/", response_model=PostPage, response_model_exclude_unset=True)
 async def list_posts(
-    channel_id: str = None,
+    request: Request,
+    response: Response,
+    channel_id: PydanticObjectId = None,
     status: PostStatus = None,
-    db: Session = Depends(get_db),
+    scheduled_from: datetime = None,
+    scheduled_to: datetime = None,
+    cursor: str = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    fields: str = None,
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Post).filter(Post.created_by == current_user.id)
+    """Posts ordered by scheduled time, one page at a time.
+
+    Pass the returned next_cursor to get the following page. `fields` is a
+    comma-separated list of PostListItem fields; lists default to a summary.
+    Pages carry an ETag derived from the versions of their posts.
+    """
+    try:
+        selected = select_fields(
+            fields,
+            PostListItem,
+            POST_SUMMARY_FIELDS,
+            ("id", "scheduled_for", "updated_at")
+        )
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {e}")
+    
+    filters = [{"author.$id": PydanticObjectId(current_user.id)}]
     
     if channel_id:
-        query = query.filter(Post.channel_id == channel_id)
+        filters.append({"channel.$id": channel_id})
     
     if status:
-        query = query.filter(Post.status == status)
+        filters.append({"status": status.value})
+    
+    if scheduled_from or scheduled_to:
+        window = {}
+        if scheduled_from:
+            window["$gte"] = scheduled_from
+        if scheduled_to:
+            window["$lt"] = scheduled_to
+        filters.append({"scheduled_for": window})
+    
+    try:
+        posts, next_cursor = await paginate(
+            PostDocument,
+            filters,
+            "scheduled_for",
+            limit,
+            cursor,
+            projection=projection_model(PostListItem, selected)
+        )
+    except InvalidCursorError:
+        # `status` is the filter here, not the fastapi module
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    etag = make_etag(
+        ",".join(sorted(selected)),
+        next_cursor,
+        *(f"{post.id}@{post.updated_at.isoformat()}" for post in posts)
+    )
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=validator_headers(etag))
+    response.headers.update(validator_headers(etag))
     
-    return query.order_by(Post.scheduled_time).all()
+    return PostPage(
+        items=[PostListItem.model_validate(post) for post in posts],
+        next_cursor=next_cursor
+    )
 
-@router.get("/{post_id}", response_model=PostResponse)
+@router.get("/{post_id}", response_model=PostDetail)
 async def get_post(
-    post_id: str,
-    db: Session = Depends(get_db),
+    post_id: PydanticObjectId,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
-    post = db.query(Post).filter(
-        Post.id == post_id,
-        Post.created_by == current_user.id
-    ).first()
+    query = {"_id": post_id, "author.$id": PydanticObjectId(current_user.id)}
     
+    # Revalidation only needs the version; the post is read when it changed
+    if is_conditional(request):
+        version = await PostDocument.find_one(query).project(DocumentVersion)
+        if not version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found"
+            )
+        etag = make_etag(version.id, version.updated_at.isoformat())
+        if not_modified(request, etag, version.updated_at):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=validator_headers(etag, version.updated_at)
+            )
+    
+    post = await PostDocument.find_one(query)
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post not found"
         )
     
-    return post
+    response.headers.update(validator_headers(
+        make_etag(post.id, post.updated_at.isoformat()),
+        post.updated_at
+    ))
+    return PostDetail.model_validate(post)
 
 @router.put("/{post_id}", response_model=PostResponse)
 async def update_post(
@@ -215,9 +486,10 @@ async def update_post(
     db.commit()
     db.refresh(post)
     
-    # Reschedule if needed
+    # Reschedule if needed: prepared posts only move in the schedule
     if post_update.scheduled_time:
-        schedule_post.delay(str(post.id))
+        if not await scheduler.reschedule(str(post.id), post.scheduled_time):
+            schedule_post.delay(str(post.id))
     
     return post
 
@@ -238,6 +510,11 @@ async def delete_post(
             detail="Post not found"
         )
     
+    image_url, thumbnail_url = post.image_url, post.thumbnail_url
     db.delete(post)
     db.commit()
+    
+    await scheduler.unschedule(post_id)
+    await asyncio.to_thread(release_blob, image_url)
+    await asyncio.to_thread(release_blob, thumbnail_url)
     return {"message": "Post deleted successfully"} 
\ No newline at end of file
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 import os
 from dotenv import load_dotenv
 
@@ -19,15 +20,56 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=3600,  # 1 hour
     worker_max_tasks_per_child=100,
-    broker_connection_retry_on_startup=True
+    broker_connection_retry_on_startup=True,
+    beat_schedule={
+        "dispatch-due-posts": {
+            "task": "app.tasks.dispatch_due_posts",
+            "schedule": float(os.getenv("SCHEDULER_TICK_SECONDS", "5")),
+        },
+        "sweep-post-metrics": {
+            "task": "app.tasks.sweep_post_metrics",
+            "schedule": float(os.getenv("METRICS_SWEEP_INTERVAL_SECONDS", "60")),
+        },
+    },
 )
 
 # Import tasks
 from .tasks import (
     schedule_post,
     publish_post,
+    dispatch_due_posts,
     update_channel_metrics,
     update_post_metrics,
+    update_post_metrics_batch,
+    sweep_post_metrics,
     generate_content,
-    generate_image
-) 
\ No newline at end of file
+    generate_image,
+    generate_post_content,
+    generate_post_image,
+    generate_content_bulk,
+    process_post_media,
+    send_emails
+) 
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    from .core.async_runtime import init_runtime, run_async
+    from .core.mongodb import init_mongodb
+    init_runtime()
+    # Indexes are managed by the API process
+    run_async(init_mongodb(index_mode="none"))
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    from .core.async_runtime import run_async, shutdown_runtime
+    from .core.mongodb import close_mongodb
+    from .core.redis import close_redis
+    from .services.email import smtp_pool
+    from .services.telegram import telegram_service
+    try:
+        run_async(telegram_service.close())
+        run_async(smtp_pool.close())
+        run_async(close_redis())
+    finally:
+        close_mongodb()
+        shutdown_runtime()
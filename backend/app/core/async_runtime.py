@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# One event loop per worker process. Clients bound to it (the aiogram/aiohttp
+# session in particular) stay open between tasks instead of being rebuilt.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def init_runtime() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+def run_async(coro: Awaitable) -> Any:
+    """Run a coroutine to completion on the worker's event loop."""
+    return init_runtime().run_until_complete(coro)
+
+def run_batch(coros: Iterable[Awaitable], concurrency: int = 10) -> List[Any]:
+    """Run coroutines concurrently, at most `concurrency` at a time.
+
+    Results keep the input order; a failed coroutine yields its exception
+    instead of aborting the rest of the batch.
+    """
+    async def _run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _limited(coro):
+            async with semaphore:
+                return await coro
+
+        return await asyncio.gather(
+            *(_limited(coro) for coro in coros),
+            return_exceptions=True
+        )
+
+    return run_async(_run())
+
+def shutdown_runtime():
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_loop.shutdown_asyncgens())
+    except Exception as e:
+        logger.error(f"Error shutting down event loop: {e}")
+    finally:
+        _loop.close()
+        _loop = None
@@ -1,22 +1,169 @@
+from collections import OrderedDict
+from datetime import timezone
+from typing import Optional
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from ..models.user import User
-from ..core.database import get_db
+from redis.exceptions import RedisError
+from ..models.mongodb import User
+from ..schemas.auth import CurrentUser
+from ..core.config import settings
+from ..core.redis import get_redis
 from ..core.security import verify_token
+import asyncio
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    # Создаем тестового пользователя
-    test_user = User(
-        id="00000000-0000-0000-0000-000000000000",
-        email="test@example.com",
-        full_name="Test User",
-        is_active=True,
-        is_superuser=True
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+# sha256(token) -> decoded payload, least recently used first
+_tokens = OrderedDict()
+# user id -> (expires at, CurrentUser), least recently used first
+_users = OrderedDict()
+
+def _user_key(user_id: str) -> str:
+    return f"auth:user:{user_id}"
+
+def _remember(cache: OrderedDict, key: str, value, size: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+def _decode(token: str) -> Optional[dict]:
+    """Decoded access token, verified once and then served from memory
+    until it expires."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    payload = _tokens.get(key)
+    if payload is None:
+        payload = verify_token(token)
+        if not payload or payload.get("type") != "access" or not payload.get("sub"):
+            return None
+        _remember(_tokens, key, payload, settings.AUTH_TOKEN_CACHE_SIZE)
+    else:
+        _tokens.move_to_end(key)
+
+    if payload["exp"] <= time.time():
+        _tokens.pop(key, None)
+        return None
+    return payload
+
+async def _load_user(user_id: str) -> Optional[CurrentUser]:
+    local = _users.get(user_id)
+    if local and local[0] > time.monotonic():
+        _users.move_to_end(user_id)
+        return local[1]
+
+    redis = get_redis()
+    cached = None
+    try:
+        cached = await redis.get(_user_key(user_id))
+    except RedisError as e:
+        logger.warning(f"User cache unavailable: {e}")
+
+    if cached:
+        user = CurrentUser.model_validate_json(cached)
+    else:
+        try:
+            document = await User.get(PydanticObjectId(user_id))
+        except InvalidId:
+            return None
+        if not document:
+            return None
+        user = CurrentUser(
+            id=str(document.id),
+            email=document.email,
+            full_name=document.full_name,
+            is_active=document.is_active,
+            is_superuser=document.is_superuser,
+            password_changed_at=document.password_changed_at
+        )
+        try:
+            await redis.set(
+                _user_key(user_id),
+                user.model_dump_json(),
+                ex=settings.AUTH_USER_CACHE_TTL_SECONDS
+            )
+        except RedisError as e:
+            logger.warning(f"User cache unavailable: {e}")
+
+    _remember(
+        _users,
+        user_id,
+        (time.monotonic() + settings.AUTH_USER_LOCAL_TTL_SECONDS, user),
+        settings.AUTH_USER_CACHE_SIZE
     )
-    return test_user 
\ No newline at end of file
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    payload = _decode(token)
+    if not payload:
+        raise credentials_exception
+
+    user = await token_user(payload)
+    if not user:
+        raise credentials_exception
+    return user
+
+async def token_user(payload: dict) -> Optional[CurrentUser]:
+    """The active user a verified token was issued to, or None once the
+    token is revoked."""
+    user = await _load_user(payload["sub"])
+    if not user or not user.is_active:
+        return None
+
+    # Tokens issued before the last password change are revoked
+    if user.password_changed_at:
+        changed_at = user.password_changed_at.replace(tzinfo=timezone.utc).timestamp()
+        if payload.get("iat", 0) < int(changed_at):
+            return None
+
+    return user
+
+def _forget(user_id: str):
+    _users.pop(user_id, None)
+    for key in [key for key, payload in _tokens.items() if payload.get("sub") == user_id]:
+        del _tokens[key]
+
+async def invalidate_user(user_id: str):
+    """Drop every cached copy of a user, in this and every other process.
+
+    Call after deactivating a user or changing their password.
+    """
+    _forget(user_id)
+    try:
+        redis = get_redis()
+        await redis.delete(_user_key(user_id))
+        await redis.publish(INVALIDATION_CHANNEL, user_id)
+    except RedisError as e:
+        # Other processes catch up within AUTH_USER_LOCAL_TTL_SECONDS
+        logger.error(f"Error publishing user invalidation: {e}")
+
+async def listen_for_invalidations():
+    """Apply invalidations published by other processes; runs until cancelled."""
+    while True:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Entries cached while we were not listening may be stale
+            _users.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _forget(message["data"].decode())
+        except RedisError as e:
+            logger.warning(f"User invalidation listener disconnected: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable
+from redis.exceptions import RedisError
+from .redis import get_redis, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+LOCK_TTL_SECONDS = 30
+WAIT_FOR_FILL_SECONDS = 2.0
+
+def _version_key(scope: str) -> str:
+    return f"cache:{scope}:version"
+
+def _entry_key(scope: str, name: str, params: dict) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"cache:{scope}:{name}:{digest}"
+
+async def cached(
+    scope: str,
+    name: str,
+    params: dict,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int,
+    stale_ttl: int
+) -> Any:
+    """Return a JSON-serializable value from Redis, recomputing it when needed.
+
+    Entries are fresh for `ttl` seconds and until the scope is invalidated.
+    Expired or invalidated entries are kept for another `stale_ttl` seconds:
+    while one caller holds the recompute lock, everyone else gets the stale
+    value instead of piling onto the database.
+    """
+    redis = get_redis()
+    key = _entry_key(scope, name, params)
+    lock_key = f"{key}:lock"
+
+    try:
+        version, raw = await redis.mget(_version_key(scope), key)
+        version = int(version or 0)
+        entry = json.loads(raw) if raw else None
+        if entry and entry["version"] == version and entry["expires_at"] > time.time():
+            return entry["value"]
+
+        locked = await redis.set(lock_key, 1, nx=True, ex=LOCK_TTL_SECONDS)
+        if not locked:
+            if entry:
+                return entry["value"]
+            # Cold key: give the caller holding the lock a moment to fill it
+            deadline = time.monotonic() + WAIT_FOR_FILL_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                raw = await redis.get(key)
+                if raw:
+                    return json.loads(raw)["value"]
+    except RedisError as e:
+        logger.warning(f"Response cache unavailable: {e}")
+        return await compute()
+
+    try:
+        value = await compute()
+        entry = {"version": version, "expires_at": time.time() + ttl, "value": value}
+        try:
+            await redis.set(key, json.dumps(entry, default=str), ex=ttl + stale_ttl)
+        except RedisError as e:
+            logger.warning(f"Response cache unavailable: {e}")
+        return value
+    finally:
+        if locked:
+            try:
+                await redis.delete(lock_key)
+            except RedisError:
+                pass
+
+def invalidate(scope: str):
+    """Mark every cached entry of a scope as stale (called from sync code)."""
+    try:
+        get_sync_redis().incr(_version_key(scope))
+    except RedisError as e:
+        logger.warning(f"Failed to invalidate cache scope {scope}: {e}")
+
+def channel_scope(channel_id) -> str:
+    return f"channel:{channel_id}"
@@ -11,6 +11,8 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "WEBPUB"
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
     
     # JWT
     SECRET_KEY: str
@@ -46,19 +48,52 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # waiting bcrypt calls before answering 503
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: int = 300  # shared Redis copy
+    AUTH_USER_LOCAL_TTL_SECONDS: int = 30  # in-process copy, also dropped on invalidation
     
     # Telegram
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    TELEGRAM_CONCURRENCY: int = 10  # parallel Bot API calls per batch task
+    TELEGRAM_GLOBAL_RATE_PER_SECOND: float = 30
+    TELEGRAM_GLOBAL_BURST: int = 30
+    TELEGRAM_CHAT_RATE_PER_MINUTE: float = 20
+    TELEGRAM_CHAT_BURST: int = 3
+    TELEGRAM_MAX_RETRIES: int = 3
+    TELEGRAM_FILE_ID_TTL_SECONDS: int = 30 * 24 * 3600
     
     # GPT API
     GPT_API_KEY: str = os.getenv("GPT_API_KEY", "")
     GPT_API_URL: str = os.getenv("GPT_API_URL", "https://api.openai.com/v1")
+    GPT_REQUESTS_PER_MINUTE: int = 500
+    GPT_TOKENS_PER_MINUTE: int = 40000
+    GPT_BULK_CONCURRENCY: int = 8
+    GPT_BULK_MAX_ITEMS: int = 500
+    GPT_BULK_WRITE_BATCH: int = 50
+    GENERATION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    GENERATION_CACHE_MAX_ENTRIES: int = 10000
+    GENERATION_CACHE_DEFAULT_PROMPT: bool = False  # reuse cached text for posts created without content
+    
+    # Bulk post import
+    POST_IMPORT_BATCH_SIZE: int = 500
+    POST_IMPORT_MAX_ERRORS: int = 1000
     
     # AWS S3
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY: str = os.getenv("AWS_SECRET_ACCESS_KEY", "")
     AWS_REGION: str = os.getenv("AWS_REGION", "us-east-1")
     S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    MAX_IMAGE_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    S3_BLOB_INDEX_SIZE: int = 10000  # content-addressed keys known to exist, per process
+
+    # Media processing
+    TELEGRAM_PHOTO_MAX_SIDE: int = 2560
+    TELEGRAM_PHOTO_BUDGET_BYTES: int = 1500 * 1024
+    THUMBNAIL_SIZE: int = 320
+    THUMBNAIL_BUDGET_BYTES: int = 40 * 1024
     
     # Email
     SMTP_HOST: str = os.getenv("SMTP_HOST", "")
@@ -66,10 +101,37 @@ class Settings(BaseSettings):
     SMTP_USER: str = os.getenv("SMTP_USER", "")
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
     EMAIL_FROM: str = os.getenv("EMAIL_FROM", "noreply@cryptocms.com")
+    SMTP_STARTTLS: Optional[bool] = None  # None: upgrade when the server offers STARTTLS
+    SMTP_TIMEOUT_SECONDS: int = 30
+    SMTP_POOL_SIZE: int = 4  # open connections per worker process
+    SMTP_POOL_IDLE_SECONDS: int = 60
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_MAX_RETRIES: int = 5
+    EMAIL_RETRY_BACKOFF_SECONDS: int = 30
     
     # MongoDB settings
     MONGODB_URL: str = "mongodb://localhost:27017"
     MONGODB_DB_NAME: str = "webpub"
+    MONGODB_INDEX_MODE: str = "create"  # "create" builds missing indexes, "verify" only reports them
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_COMPRESSORS: str = "zstd,snappy,zlib"  # negotiated with the server, first match wins
+
+    # Metrics endpoints response cache
+    METRICS_CACHE_TTL_SECONDS: int = 30
+    METRICS_CACHE_STALE_SECONDS: int = 300
+
+    # Post metrics sweeper
+    METRICS_SWEEP_LIMIT: int = 5000
+    METRICS_BATCH_SIZE: int = 50
+    METRICS_SHARDS: int = 4  # keep in sync with the metrics-N queues in docker-compose
+    
+    # Publish scheduler
+    SCHEDULER_BATCH_SIZE: int = 100
+    SCHEDULER_MAX_BATCHES: int = 50  # per tick
+    SCHEDULER_LEASE_SECONDS: int = 60
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,59 @@
+from datetime import datetime
+from typing import Dict, List, Type
+from beanie import Document
+from bson import ObjectId
+from app.models.mongodb import User, Channel, Post, ChannelMetrics, PostStatus
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _hot_queries() -> List[tuple]:
+    """(name, model, filter, sort) for the queries the API runs the most.
+
+    Values are placeholders: explain() only needs the query shape.
+    """
+    some_id = ObjectId()
+    now = datetime.utcnow()
+    return [
+        ("users.by_email", User, {"email": "user@example.com"}, None),
+        ("channels.by_owner", Channel, {"owner.$id": some_id}, [("created_at", -1), ("_id", -1)]),
+        ("posts.by_author", Post, {"author.$id": some_id}, [("scheduled_for", 1), ("_id", 1)]),
+        ("posts.by_author_status", Post, {"author.$id": some_id, "status": PostStatus.SCHEDULED.value}, [("scheduled_for", 1), ("_id", 1)]),
+        ("posts.by_channel", Post, {"author.$id": some_id, "channel.$id": some_id}, [("scheduled_for", 1), ("_id", 1)]),
+        ("posts.scheduled_due", Post, {"status": PostStatus.SCHEDULED.value, "scheduled_for": {"$lte": now}}, [("scheduled_for", 1)]),
+        ("posts.by_channel_since", Post, {"channel.$id": some_id, "created_at": {"$gte": now}}, None),
+        ("channel_metrics.latest", ChannelMetrics, {"channel.$id": some_id}, [("metric_date", -1)]),
+    ]
+
+async def verify_indexes(models: List[Type[Document]]) -> Dict[str, List[str]]:
+    """Return the declared indexes missing from each collection."""
+    missing = {}
+    for model in models:
+        declared = getattr(model.Settings, "indexes", [])
+        if not declared:
+            continue
+        existing = await model.get_motor_collection().index_information()
+        absent = [index.document["name"] for index in declared if index.document["name"] not in existing]
+        if absent:
+            missing[model.Settings.name] = absent
+    return missing
+
+def _plan_indexes(plan: dict) -> List[str]:
+    if plan.get("stage") == "COLLSCAN":
+        return ["COLLSCAN"]
+    found = [plan["indexName"]] if "indexName" in plan else []
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            found += _plan_indexes(child)
+    return found
+
+async def explain_hot_queries() -> Dict[str, List[str]]:
+    """Map each hot query to the indexes of its winning plan (or COLLSCAN)."""
+    report = {}
+    for name, model, query, sort in _hot_queries():
+        cursor = model.get_motor_collection().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        report[name] = _plan_indexes(explain["queryPlanner"]["winningPlan"])
+    return report
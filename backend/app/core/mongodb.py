@@ -1,21 +1,65 @@
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from app.core.config import settings
-from app.models.mongodb import User, Channel, Post, ChannelMetrics
+from app.core.indexes import verify_indexes, explain_hot_queries
+from app.models.mongodb import User, Channel, Post, ChannelMetrics, ChannelMetricsRollup
+import logging
 
-async def init_mongodb():
-    """Initialize MongoDB connection and register models"""
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
+logger = logging.getLogger(__name__)
+
+# Process-wide client: one connection pool and one set of monitor threads
+# shared by the API, Celery workers and scripts.
+_client: Optional[AsyncIOMotorClient] = None
+
+DOCUMENT_MODELS = [
+    User,
+    Channel,
+    Post,
+    ChannelMetrics,
+    ChannelMetricsRollup
+]
+
+def get_client() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            compressors=settings.MONGODB_COMPRESSORS or None
+        )
+    return _client
+
+def close_mongodb():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+async def init_mongodb(index_mode: Optional[str] = None):
+    """Initialize MongoDB connection and register models.
+
+    index_mode "create" (the default from MONGODB_INDEX_MODE) builds the
+    indexes declared on the models; "verify" leaves the database untouched
+    and logs missing indexes and the plans of the hot queries instead;
+    "none" skips index handling altogether.
+    """
+    index_mode = index_mode or settings.MONGODB_INDEX_MODE
     await init_beanie(
-        database=client[settings.MONGODB_DB_NAME],
-        document_models=[
-            User,
-            Channel,
-            Post,
-            ChannelMetrics
-        ]
+        database=get_client()[settings.MONGODB_DB_NAME],
+        document_models=DOCUMENT_MODELS,
+        skip_indexes=index_mode != "create"
     )
 
+    if index_mode == "verify":
+        missing = await verify_indexes(DOCUMENT_MODELS)
+        for collection, names in missing.items():
+            logger.warning(f"Missing indexes on {collection}: {', '.join(names)}")
+        for query, indexes in (await explain_hot_queries()).items():
+            logger.info(f"Query {query} uses: {', '.join(indexes) or 'no index'}")
+
 async def get_database():
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
-    return client[settings.MONGODB_DB_NAME] 
\ No newline at end of file
+    return get_client()[settings.MONGODB_DB_NAME]
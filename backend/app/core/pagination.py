@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import List, Optional, Tuple, Type
+from beanie import Document, PydanticObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+import base64
+import binascii
+import json
+
+class InvalidCursorError(ValueError):
+    pass
+
+def encode_cursor(field: str, value: Optional[datetime], document_id) -> str:
+    payload = json.dumps([field, value.isoformat() if value else None, str(document_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(field: str, cursor: str) -> Tuple[Optional[datetime], PydanticObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        name, value, document_id = json.loads(base64.urlsafe_b64decode(padded))
+        if name != field:
+            raise InvalidCursorError(cursor)
+        return (
+            datetime.fromisoformat(value) if value else None,
+            PydanticObjectId(document_id)
+        )
+    except (ValueError, TypeError, binascii.Error, InvalidId) as e:
+        raise InvalidCursorError(cursor) from e
+
+def _after(field: str, value: Optional[datetime], document_id, direction: int) -> dict:
+    """Filter for the documents sorting after (value, document_id).
+
+    Missing values sort first, so they only precede other missing values
+    when ascending and only follow real values when descending.
+    """
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if value is None:
+        ties = {field: None, "_id": {op: document_id}}
+        return {"$or": [ties, {field: {"$ne": None}}]} if direction == ASCENDING else ties
+    later = {field: {op: value}}
+    if direction == DESCENDING:
+        later = {"$or": [later, {field: None}]}
+    return {"$or": [later, {field: value, "_id": {op: document_id}}]}
+
+async def paginate(
+    model: Type[Document],
+    filters: List[dict],
+    field: str,
+    limit: int,
+    cursor: str = None,
+    direction: int = ASCENDING,
+    projection: Type[BaseModel] = None
+) -> Tuple[list, Optional[str]]:
+    """Keyset pagination on (field, _id).
+
+    Reads limit + 1 documents to tell whether another page follows and
+    returns the page with the cursor of the next one (None on the last
+    page). With a projection model only its fields are read; it must
+    include field and id. Raises InvalidCursorError for cursors not issued
+    for field.
+    """
+    if cursor:
+        filters = filters + [_after(field, *decode_cursor(field, cursor), direction)]
+    query = {"$and": filters} if filters else {}
+
+    documents = model.find(query).sort(
+        [(field, direction), ("_id", direction)]
+    ).limit(limit + 1)
+    if projection is not None:
+        documents = documents.project(projection)
+    documents = await documents.to_list()
+
+    if len(documents) <= limit:
+        return documents, None
+    last = documents[limit - 1]
+    return documents[:limit], encode_cursor(field, getattr(last, field), last.id)
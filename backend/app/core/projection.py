@@ -0,0 +1,51 @@
+from functools import lru_cache
+from typing import Iterable, Optional, Type
+from pydantic import AliasChoices, BaseModel, create_model
+
+class InvalidFieldsError(ValueError):
+    pass
+
+def select_fields(
+    fields: Optional[str],
+    model: Type[BaseModel],
+    default: Iterable[str],
+    required: Iterable[str] = ()
+) -> frozenset:
+    """Parse a comma-separated `fields=` value against the fields of model.
+
+    Falls back to default when nothing is asked for; required fields (the
+    id and the sort key) are always added.
+    """
+    selected = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    unknown = selected - set(model.model_fields)
+    if unknown:
+        raise InvalidFieldsError(", ".join(sorted(unknown)))
+    return frozenset((selected or set(default)) | set(required))
+
+def _source(name: str, field) -> str:
+    alias = field.validation_alias
+    if isinstance(alias, AliasChoices):
+        return alias.choices[0]
+    return alias or name
+
+@lru_cache(maxsize=256)
+def projection_model(model: Type[BaseModel], fields: frozenset) -> Type[BaseModel]:
+    """Beanie projection model with just the given fields of model.
+
+    The generated class derives from model's base, which carries the shared
+    validators, and tells Mongo to return only the matching paths.
+    """
+    definitions = {
+        name: (field.annotation, field)
+        for name, field in model.model_fields.items()
+        if name in fields
+    }
+    projected = create_model(
+        f"{model.__name__}Projection",
+        __base__=model.__bases__[0],
+        **definitions
+    )
+    projected.Settings = type("Settings", (), {
+        "projection": {_source(name, field): 1 for name, (_, field) in definitions.items()}
+    })
+    return projected
@@ -0,0 +1,26 @@
+import redis
+import redis.asyncio as aioredis
+from .config import settings
+
+_async_client = None
+_sync_client = None
+
+def get_redis() -> aioredis.Redis:
+    """Process-wide asyncio Redis client (API handlers, worker event loop)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.REDIS_URL)
+    return _async_client
+
+def get_sync_redis() -> redis.Redis:
+    """Process-wide blocking Redis client for synchronous Celery task code."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _sync_client
+
+async def close_redis():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
@@ -1,9 +1,28 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from prometheus_client import make_asgi_app
 from .api import auth, channels, posts, metrics, settings
-from .core.mongodb import init_mongodb
+from .core.auth import listen_for_invalidations
+from .core.mongodb import init_mongodb, close_mongodb
+from .core.redis import close_redis
+from .core.security import password_hasher, PasswordHasherBusy
+from .services.telegram import telegram_service
 
-app = FastAPI(title="WEBPUB API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_mongodb()
+    invalidations = asyncio.create_task(listen_for_invalidations())
+    yield
+    invalidations.cancel()
+    await telegram_service.close()
+    await close_redis()
+    close_mongodb()
+    password_hasher.shutdown()
+
+app = FastAPI(title="WEBPUB API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -14,6 +33,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    # Shed login bursts instead of letting every request queue behind bcrypt
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many authentication requests, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+# Prometheus metrics; /metrics is taken by the channel metrics API
+app.mount("/prometheus", make_asgi_app())
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(channels.router, prefix="/channels", tags=["channels"])
@@ -21,10 +52,6 @@ app.include_router(posts.router, prefix="/posts", tags=["posts"])
 app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 app.include_router(settings.router, prefix="/settings", tags=["settings"])
 
-@app.on_event("startup")
-async def startup_event():
-    await init_mongodb()
-
 @app.get("/")
 async def root():
     return {"message": "Welcome to WEBPUB API"} 
\ No newline at end of file
@@ -1,13 +1,16 @@
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
-from beanie import Document, Link
-from pydantic import EmailStr, Field
+from beanie import Document, Link, Replace, Save, SaveChanges, before_event
+from pydantic import BaseModel, EmailStr, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 class PostStatus(str, Enum):
     DRAFT = "draft"
     SCHEDULED = "scheduled"
+    PUBLISHING = "publishing"  # claimed by a publish worker
     PUBLISHED = "published"
+    FAILED = "failed"
 
 class PostMetrics(BaseModel):
     views: int = 0
@@ -24,11 +27,17 @@ class User(Document):
     full_name: str
     is_active: bool = True
     is_superuser: bool = False
+    role: str = "operator"
+    password_changed_at: Optional[datetime] = None
+    reset_password_token: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ]
         
     class Config:
         json_schema_extra = {
@@ -48,8 +57,18 @@ class Channel(Document):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @before_event(Replace, Save, SaveChanges)
+    def touch(self):
+        self.updated_at = datetime.utcnow()
+
     class Settings:
         name = "channels"
+        indexes = [
+            IndexModel(
+                [("owner.$id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="owner_created_at"
+            ),
+        ]
 
 class Post(Document):
     title: str
@@ -57,6 +76,8 @@ class Post(Document):
     content: str
     status: PostStatus = PostStatus.DRAFT
     media_urls: List[str] = []
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     
     # Metrics
     views_count: int = 0
@@ -70,14 +91,54 @@ class Post(Document):
     author: Link[User]
     channel: Link[Channel]
     
+    # Telegram
+    telegram_message_id: Optional[str] = None
+    metrics_updated_at: Optional[datetime] = None  # claimed by the last metrics sweep
+    metrics_recorded_at: Optional[datetime] = None  # counters last written from Telegram stats
+    
     # Dates
     scheduled_for: Optional[datetime]
     published_at: Optional[datetime]
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @before_event(Replace, Save, SaveChanges)
+    def touch(self):
+        # updated_at is the version behind ETag / Last-Modified
+        self.updated_at = datetime.utcnow()
+
     class Settings:
         name = "posts"
+        indexes = [
+            IndexModel(
+                [("author.$id", ASCENDING), ("scheduled_for", ASCENDING), ("_id", ASCENDING)],
+                name="author_scheduled_for"
+            ),
+            IndexModel(
+                [("author.$id", ASCENDING), ("status", ASCENDING), ("scheduled_for", ASCENDING), ("_id", ASCENDING)],
+                name="author_status_scheduled_for_id"
+            ),
+            IndexModel(
+                [("channel.$id", ASCENDING), ("scheduled_for", ASCENDING), ("_id", ASCENDING)],
+                name="channel_scheduled_for"
+            ),
+            IndexModel(
+                [("channel.$id", ASCENDING), ("created_at", DESCENDING)],
+                name="channel_created_at"
+            ),
+            # Only posts waiting to be published are looked up by due time
+            IndexModel(
+                [("scheduled_for", ASCENDING)],
+                name="scheduled_due",
+                partialFilterExpression={"status": PostStatus.SCHEDULED.value}
+            ),
+            # Metrics sweeps look up published posts by age
+            IndexModel(
+                [("published_at", DESCENDING), ("metrics_updated_at", ASCENDING)],
+                name="published_metrics",
+                partialFilterExpression={"status": PostStatus.PUBLISHED.value}
+            ),
+        ]
 
 class ChannelMetrics(Document):
     channel: Link[Channel]
@@ -88,4 +149,37 @@ class ChannelMetrics(Document):
     metric_date: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
-        name = "channel_metrics" 
\ No newline at end of file
+        name = "channel_metrics"
+        indexes = [
+            IndexModel(
+                [("channel.$id", ASCENDING), ("metric_date", DESCENDING)],
+                name="channel_metric_date"
+            ),
+        ]
+
+class ChannelMetricsRollup(Document):
+    """Pre-aggregated post metrics of a channel for one hour or day bucket.
+
+    Posts are bucketed by their creation time; counters are maintained
+    incrementally with $inc by app.services.metrics_rollup.
+    """
+    channel: str
+    granularity: str  # "hour" or "day"
+    bucket: datetime
+    posts: int = 0
+    views: int = 0
+    likes: int = 0
+    comments: int = 0
+    shares: int = 0
+    engagement: int = 0  # likes + comments + shares
+    ctr_sum: float = 0.0
+
+    class Settings:
+        name = "channel_metrics_rollups"
+        indexes = [
+            IndexModel(
+                [("channel", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+                name="channel_granularity_bucket",
+                unique=True
+            ),
+        ]
\ No newline at end of file
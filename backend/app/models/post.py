@@ -17,6 +17,7 @@ class Post(Document):
     status: PostStatus = PostStatus.DRAFT
     publish_at: Optional[datetime] = None
     published_at: Optional[datetime] = None
+    metrics_updated_at: Optional[datetime] = None
     media_urls: List[str] = []
     thumbnail_url: Optional[str] = None
     views: int = 0
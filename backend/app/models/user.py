@@ -15,6 +15,7 @@ class User(Document):
     full_name: Optional[str] = None
     is_active: bool = True
     is_superuser: bool = False
+    password_changed_at: Optional[datetime] = None
     role: UserRole = UserRole.USER
     created_at: datetime = datetime.utcnow()
     updated_at: datetime = datetime.utcnow()
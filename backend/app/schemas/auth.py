@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+from datetime import datetime
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -21,6 +22,15 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class CurrentUser(BaseModel):
+    """The authenticated user as cached by get_current_user."""
+    id: str
+    email: str
+    full_name: Optional[str] = None
+    is_active: bool
+    is_superuser: bool = False
+    password_changed_at: Optional[datetime] = None
+
 class Token(BaseModel):
     access_token: str
     refresh_token: Optional[str] = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, Field, field_validator
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 
@@ -33,4 +33,42 @@ class ChannelStats(BaseModel):
     average_engagement: int = Field(default=0)  # Percentage
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class ChannelFields(BaseModel):
+    """Base of ChannelListItem, ChannelDetail and of the projections generated
+    from ChannelListItem."""
+
+    @field_validator("id", mode="before", check_fields=False)
+    @classmethod
+    def object_id(cls, value):
+        return str(value)
+
+    class Config:
+        from_attributes = True
+
+class ChannelListItem(ChannelFields):
+    """A channel in a list; only the requested fields are set."""
+    id: str = Field(validation_alias=AliasChoices("_id", "id"))
+    username: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    is_monetized: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ChannelDetail(ChannelFields):
+    """A single channel with all of its fields."""
+    id: str = Field(validation_alias=AliasChoices("_id", "id"))
+    username: str
+    category: str
+    description: Optional[str] = None
+    is_monetized: bool = False
+    created_at: datetime
+    updated_at: datetime
+
+CHANNEL_SUMMARY_FIELDS = ("id", "username", "category", "created_at")
+
+class ChannelPage(BaseModel):
+    items: List[ChannelListItem]
+    next_cursor: Optional[str] = None
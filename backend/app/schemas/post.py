@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, Field, field_validator, model_validator
+from typing import Any, List, Literal, Optional
 from datetime import datetime
 from uuid import UUID
 from enum import Enum
@@ -46,4 +46,122 @@ class PostMetrics(BaseModel):
     ctr: int = Field(default=0)  # Click-through rate in percentage
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class GenerationJob(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    post_id: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    total: Optional[int] = None
+    completed: Optional[int] = None
+    failed: Optional[int] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class BulkGenerationItem(BaseModel):
+    post_id: str
+    prompt: Optional[str] = None
+
+class BulkGenerationRequest(BaseModel):
+    items: List[BulkGenerationItem]
+
+class PostImportRow(BaseModel):
+    channel_id: str
+    title: str = Field(min_length=1)
+    content: str = Field(min_length=1)
+    description: Optional[str] = None
+    status: Literal["draft", "scheduled"] = "draft"
+    scheduled_for: Optional[datetime] = None
+    media_urls: List[str] = []
+
+    @field_validator("media_urls", mode="before")
+    @classmethod
+    def split_media_urls(cls, value):
+        # CSV cells hold several URLs separated by "|" or whitespace
+        if isinstance(value, str):
+            return value.replace("|", " ").split()
+        return value
+
+    @model_validator(mode="after")
+    def check_schedule(self):
+        if self.status == "scheduled" and not self.scheduled_for:
+            raise ValueError("scheduled posts need scheduled_for")
+        return self
+
+class PostImportError(BaseModel):
+    line: int
+    error: str
+
+class PostImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[PostImportError]
+    errors_truncated: bool = False
+
+def ref_id(value) -> str:
+    """Id behind a Beanie Link, a DBRef or a plain ObjectId."""
+    value = getattr(value, "ref", value)
+    return str(getattr(value, "id", value))
+
+class PostFields(BaseModel):
+    """Base of PostListItem, PostDetail and of the projections generated from
+    PostListItem."""
+
+    @field_validator("id", "channel_id", mode="before", check_fields=False)
+    @classmethod
+    def ref_ids(cls, value):
+        return ref_id(value)
+
+    class Config:
+        from_attributes = True
+
+class PostListItem(PostFields):
+    """A post in a list; only the requested fields are set."""
+    id: str = Field(validation_alias=AliasChoices("_id", "id"))
+    channel_id: Optional[str] = Field(default=None, validation_alias=AliasChoices("channel", "channel_id"))
+    title: Optional[str] = None
+    description: Optional[str] = None
+    content: Optional[str] = None
+    status: Optional[str] = None
+    media_urls: Optional[List[str]] = None
+    views_count: Optional[int] = None
+    likes_count: Optional[int] = None
+    comments_count: Optional[int] = None
+    shares_count: Optional[int] = None
+    scheduled_for: Optional[datetime] = None
+    published_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PostDetail(PostFields):
+    """A single post with all of its fields."""
+    id: str = Field(validation_alias=AliasChoices("_id", "id"))
+    channel_id: str = Field(validation_alias=AliasChoices("channel", "channel_id"))
+    title: str
+    description: Optional[str] = None
+    content: str
+    status: str
+    media_urls: List[str] = []
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    views_count: int = 0
+    likes_count: int = 0
+    comments_count: int = 0
+    shares_count: int = 0
+    ctr: float = 0.0
+    revenue: float = 0.0
+    telegram_message_id: Optional[str] = None
+    scheduled_for: Optional[datetime] = None
+    published_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+# What list views get unless they ask for other fields
+POST_SUMMARY_FIELDS = ("id", "channel_id", "title", "status", "scheduled_for", "published_at")
+
+class PostPage(BaseModel):
+    items: List[PostListItem]
+    next_cursor: Optional[str] = None
@@ -1,17 +1,17 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.message import EmailMessage
+from typing import List, Optional
+import aiosmtplib
 from ..core.config import settings
+import asyncio
+import logging
+import time
 
-async def send_password_reset_email(email: str, reset_token: str):
-    if not all([settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_USER, settings.SMTP_PASSWORD]):
-        return
-    
-    message = MIMEMultipart()
-    message["From"] = settings.EMAIL_FROM
-    message["To"] = email
-    message["Subject"] = "Password Reset Request"
-    
+logger = logging.getLogger(__name__)
+
+def smtp_configured() -> bool:
+    return bool(settings.SMTP_HOST and settings.SMTP_PORT)
+
+def password_reset_email(email: str, reset_token: str) -> dict:
     reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
     body = f"""
     <html>
@@ -24,13 +24,98 @@ async def send_password_reset_email(email: str, reset_token: str):
         </body>
     </html>
     """
-    
-    message.attach(MIMEText(body, "html"))
-    
-    try:
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(message)
-    except Exception as e:
-        print(f"Failed to send email: {e}") 
\ No newline at end of file
+    return {"to": email, "subject": "Password Reset Request", "html": body}
+
+def _build_message(email: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.EMAIL_FROM
+    message["To"] = email["to"]
+    message["Subject"] = email["subject"]
+    message.set_content(email["html"], subtype="html")
+    return message
+
+class SMTPPool:
+    """Authenticated SMTP connections kept open between sends.
+
+    Lives on the worker event loop. Connections idle for longer than
+    SMTP_POOL_IDLE_SECONDS are replaced, since servers drop them anyway.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: List[tuple] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            start_tls=settings.SMTP_STARTTLS,
+            timeout=settings.SMTP_TIMEOUT_SECONDS
+        )
+        await client.connect()
+        if settings.SMTP_USER:
+            await client.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        return client
+
+    async def send(self, message: EmailMessage):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            client = None
+            while self._idle and client is None:
+                client, idle_since = self._idle.pop()
+                if not client.is_connected or time.monotonic() - idle_since > settings.SMTP_POOL_IDLE_SECONDS:
+                    client.close()
+                    client = None
+            if client is None:
+                client = await self._connect()
+
+            try:
+                await client.send_message(message)
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                # The server answered: the connection is still usable
+                self._idle.append((client, time.monotonic()))
+                raise
+            except Exception:
+                client.close()
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+
+smtp_pool = SMTPPool(settings.SMTP_POOL_SIZE)
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(500 <= refused.code < 600 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 500 <= error.code < 600
+    return False
+
+async def send_emails(emails: List[dict]) -> List[dict]:
+    """Send emails concurrently over the pooled connections.
+
+    Returns the emails that failed with a temporary error and are worth
+    retrying; permanently rejected ones are logged and dropped.
+    """
+    async def _send(email: dict):
+        try:
+            await smtp_pool.send(_build_message(email))
+        except Exception as e:
+            if _is_permanent(e):
+                logger.error(f"Email to {email['to']} rejected: {e}")
+                return None
+            logger.warning(f"Failed to send email to {email['to']}: {e}")
+            return email
+        return None
+
+    results = await asyncio.gather(*(_send(email) for email in emails))
+    return [email for email in results if email is not None]
@@ -1,39 +1,322 @@
 import openai
 from ..core.config import settings
+from ..core.redis import get_redis, get_sync_redis
+from redis.exceptions import RedisError
+import asyncio
+import hashlib
+import json
 import logging
 import requests
+import time
 from io import BytesIO
+from typing import AsyncIterator, Callable, Optional
 
 logger = logging.getLogger(__name__)
 
 openai.api_key = settings.GPT_API_KEY
 
-def generate_content(prompt: str = None) -> str:
+CONTENT_MODEL = "gpt-4"
+CONTENT_MAX_TOKENS = 500
+CONTENT_TEMPERATURE = 0.7
+DEFAULT_CONTENT_PROMPT = "Generate an engaging post about cryptocurrency or blockchain technology. Include relevant hashtags."
+CONTENT_SYSTEM_PROMPT = "You are a professional cryptocurrency content creator. Create engaging and informative posts."
+IMAGE_SIZE = "1024x1024"
+
+GENERATION_CACHE_INDEX = "gencache:index"
+INFLIGHT_TTL_SECONDS = 120
+INFLIGHT_POLL_SECONDS = 0.25
+
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split()).casefold()
+
+def _generation_key(kind: str, params: dict) -> str:
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"gencache:{kind}:{digest}"
+
+def _store_generation(redis, key: str, value: str):
+    pipe = redis.pipeline()
+    pipe.set(key, value, ex=settings.GENERATION_CACHE_TTL_SECONDS)
+    pipe.zadd(GENERATION_CACHE_INDEX, {key: time.time()})
+    pipe.zcard(GENERATION_CACHE_INDEX)
+    size = pipe.execute()[-1]
+
+    # Evict the oldest entries once the cache grows past its size limit
+    excess = size - settings.GENERATION_CACHE_MAX_ENTRIES
+    if excess > 0:
+        oldest = redis.zrange(GENERATION_CACHE_INDEX, 0, excess - 1)
+        pipe = redis.pipeline()
+        pipe.delete(*oldest)
+        pipe.zrem(GENERATION_CACHE_INDEX, *oldest)
+        pipe.execute()
+
+def cached_generation(kind: str, params: dict, generate: Callable[[], str]) -> str:
+    """Return a cached result for identical generation parameters.
+
+    Concurrent callers with the same parameters share one upstream call:
+    the first one takes an in-flight marker and generates, the others wait
+    for its result. Empty (failed) results are not cached.
+    """
+    key = _generation_key(kind, params)
+    inflight_key = f"{key}:inflight"
+    try:
+        redis = get_sync_redis()
+        cached = redis.get(key)
+        if cached is not None:
+            return cached.decode()
+
+        deadline = time.monotonic() + INFLIGHT_TTL_SECONDS
+        while not redis.set(inflight_key, 1, nx=True, ex=INFLIGHT_TTL_SECONDS):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(INFLIGHT_POLL_SECONDS)
+            cached = redis.get(key)
+            if cached is not None:
+                return cached.decode()
+    except RedisError as e:
+        logger.warning(f"Generation cache unavailable: {e}")
+        return generate()
+
+    try:
+        value = generate()
+        if value:
+            _store_generation(redis, key, value)
+        return value
+    except RedisError as e:
+        logger.warning(f"Generation cache unavailable: {e}")
+        return value
+    finally:
+        try:
+            redis.delete(inflight_key)
+        except RedisError:
+            pass
+
+def forget_generation(kind: str, params: dict):
+    """Drop the cached result for these parameters, e.g. once it went stale."""
+    key = _generation_key(kind, params)
+    try:
+        redis = get_sync_redis()
+        redis.delete(key)
+        redis.zrem(GENERATION_CACHE_INDEX, key)
+    except RedisError as e:
+        logger.warning(f"Generation cache unavailable: {e}")
+
+def content_params(prompt: str = None) -> dict:
+    return {
+        "model": CONTENT_MODEL,
+        "system": CONTENT_SYSTEM_PROMPT,
+        "prompt": _normalize_prompt(prompt or DEFAULT_CONTENT_PROMPT),
+        "max_tokens": CONTENT_MAX_TOKENS,
+        "temperature": CONTENT_TEMPERATURE
+    }
+
+def image_params(prompt: str) -> dict:
+    return {"model": "dall-e", "prompt": _normalize_prompt(prompt), "size": IMAGE_SIZE}
+
+def _content_messages(prompt: str = None) -> list:
+    return [
+        {"role": "system", "content": CONTENT_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt or DEFAULT_CONTENT_PROMPT}
+    ]
+
+def generate_content(prompt: str = None, allow_cached: Optional[bool] = None) -> str:
+    """Generate post content.
+
+    Results for explicit prompts are cached; the default prompt is only
+    served from the cache when allow_cached is set, since every post
+    created without content would otherwise get the same text.
+    """
+    if allow_cached is None:
+        allow_cached = bool(prompt)
+    if allow_cached:
+        return cached_generation(
+            "content",
+            content_params(prompt),
+            lambda: _generate_content(prompt)
+        )
+    return _generate_content(prompt)
+
+def _generate_content(prompt: str = None) -> str:
+    reserved = estimate_tokens(prompt)
+    generation_budget.acquire_sync(reserved)
+    used = reserved
     try:
-        if not prompt:
-            prompt = "Generate an engaging post about cryptocurrency or blockchain technology. Include relevant hashtags."
-        
         response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a professional cryptocurrency content creator. Create engaging and informative posts."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
+            model=CONTENT_MODEL,
+            messages=_content_messages(prompt),
+            max_tokens=CONTENT_MAX_TOKENS,
+            temperature=CONTENT_TEMPERATURE
         )
+        used = response.usage.total_tokens
         
         return response.choices[0].message.content.strip()
     except Exception as e:
         logger.error(f"Error generating content: {e}")
         return ""
+    finally:
+        generation_budget.settle_sync(reserved, used)
+
+# KEYS: budget  ARGV: request rate (per ms), requests per minute,
+#                     token rate (per ms), tokens per minute, tokens to reserve
+# Returns 0 once a request and the tokens are reserved, otherwise the number
+# of ms to wait. A reservation above the token budget waits for a full bucket.
+BUDGET_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local request_rate, request_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local token_rate, token_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local ts = tonumber(state[3]) or now
+local requests = math.min(request_burst, (tonumber(state[1]) or request_burst) + (now - ts) * request_rate)
+local tokens = math.min(token_burst, (tonumber(state[2]) or token_burst) + (now - ts) * token_rate)
+
+local need = math.min(cost, token_burst)
+if requests < 1 or tokens < need then
+    return math.max(
+        math.ceil((1 - requests) / request_rate),
+        math.ceil((need - tokens) / token_rate)
+    )
+end
+
+redis.call('HSET', KEYS[1], 'requests', requests - 1, 'tokens', tokens - cost, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return 0
+"""
+
+# KEYS: budget  ARGV: tokens to give back (negative when usage exceeded the estimate)
+BUDGET_SETTLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'tokens', ARGV[1])
+end
+"""
+
+class GenerationBudget:
+    """Requests-per-minute and tokens-per-minute budget for the GPT API,
+    shared by every API and worker process via Redis.
+
+    Both budgets are token buckets refilled continuously. Token usage is
+    reserved from an estimate before each call and settled against the
+    usage reported by the API afterwards.
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, key: str = "gpt:budget"):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.key = key
+        self._scripts = None
+        self._sync_scripts = None
+    
+    def _args(self, tokens: int) -> list:
+        return [self.rpm / 60000, self.rpm, self.tpm / 60000, self.tpm, tokens]
+    
+    async def acquire(self, tokens: int):
+        redis = get_redis()
+        if self._scripts is None:
+            self._scripts = (
+                redis.register_script(BUDGET_ACQUIRE_SCRIPT),
+                redis.register_script(BUDGET_SETTLE_SCRIPT)
+            )
+        try:
+            while True:
+                wait_ms = await self._scripts[0](keys=[self.key], args=self._args(tokens))
+                if not wait_ms:
+                    return
+                await asyncio.sleep(int(wait_ms) / 1000)
+        except RedisError as e:
+            # Never block generation because the budget is unavailable
+            logger.warning(f"GPT budget unavailable: {e}")
+    
+    async def settle(self, reserved: int, used: int):
+        if reserved == used or self._scripts is None:
+            return
+        try:
+            await self._scripts[1](keys=[self.key], args=[reserved - used])
+        except RedisError as e:
+            logger.warning(f"GPT budget unavailable: {e}")
+    
+    def acquire_sync(self, tokens: int):
+        redis = get_sync_redis()
+        if self._sync_scripts is None:
+            self._sync_scripts = (
+                redis.register_script(BUDGET_ACQUIRE_SCRIPT),
+                redis.register_script(BUDGET_SETTLE_SCRIPT)
+            )
+        try:
+            while True:
+                wait_ms = self._sync_scripts[0](keys=[self.key], args=self._args(tokens))
+                if not wait_ms:
+                    return
+                time.sleep(int(wait_ms) / 1000)
+        except RedisError as e:
+            logger.warning(f"GPT budget unavailable: {e}")
+    
+    def settle_sync(self, reserved: int, used: int):
+        if reserved == used or self._sync_scripts is None:
+            return
+        try:
+            self._sync_scripts[1](keys=[self.key], args=[reserved - used])
+        except RedisError as e:
+            logger.warning(f"GPT budget unavailable: {e}")
+
+generation_budget = GenerationBudget(settings.GPT_REQUESTS_PER_MINUTE, settings.GPT_TOKENS_PER_MINUTE)
+
+def estimate_tokens(prompt: str = None) -> int:
+    # ~4 characters per token for the prompt plus the full completion
+    text = CONTENT_SYSTEM_PROMPT + (prompt or DEFAULT_CONTENT_PROMPT)
+    return len(text) // 4 + CONTENT_MAX_TOKENS
+
+async def agenerate_content(prompt: str = None) -> str:
+    reserved = estimate_tokens(prompt)
+    await generation_budget.acquire(reserved)
+    used = reserved
+    try:
+        response = await openai.ChatCompletion.acreate(
+            model=CONTENT_MODEL,
+            messages=_content_messages(prompt),
+            max_tokens=CONTENT_MAX_TOKENS,
+            temperature=CONTENT_TEMPERATURE
+        )
+        used = response.usage.total_tokens
+        return response.choices[0].message.content.strip()
+    finally:
+        await generation_budget.settle(reserved, used)
+
+async def stream_content(prompt: str = None) -> AsyncIterator[str]:
+    """Yield content tokens as the model produces them.
+
+    Closing the generator closes the upstream HTTP stream, which stops the
+    generation (and its token usage) on the provider side.
+    """
+    reserved = estimate_tokens(prompt)
+    await generation_budget.acquire(reserved)
+    # Streams report no usage: count the prompt estimate plus one token per chunk
+    used = reserved - CONTENT_MAX_TOKENS
+    try:
+        response = await openai.ChatCompletion.acreate(
+            model=CONTENT_MODEL,
+            messages=_content_messages(prompt),
+            max_tokens=CONTENT_MAX_TOKENS,
+            temperature=CONTENT_TEMPERATURE,
+            stream=True
+        )
+        try:
+            async for chunk in response:
+                used += 1
+                text = chunk.choices[0].delta.get("content")
+                if text:
+                    yield text
+        finally:
+            await response.aclose()
+    finally:
+        await generation_budget.settle(reserved, used)
 
 def generate_image(prompt: str) -> bytes:
     try:
         response = openai.Image.create(
             prompt=prompt,
             n=1,
-            size="1024x1024",
+            size=IMAGE_SIZE,
             response_format="url"
         )
         
@@ -0,0 +1,84 @@
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from ..core.redis import get_redis, get_sync_redis
+
+JOB_TTL_SECONDS = 24 * 3600
+KEEPALIVE_SECONDS = 15
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def _events_channel(job_id: str) -> str:
+    return f"job:{job_id}:events"
+
+def _decode(raw: dict) -> dict:
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    if "result" in job:
+        job["result"] = json.loads(job["result"])
+    return job
+
+async def create_job(kind: str, user_id: str, post_id: str = "", **fields) -> dict:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "user_id": str(user_id),
+        "post_id": str(post_id),
+        "created_at": datetime.utcnow().isoformat(),
+        **fields
+    }
+    redis = get_redis()
+    await redis.hset(_job_key(job["job_id"]), mapping=job)
+    await redis.expire(_job_key(job["job_id"]), JOB_TTL_SECONDS)
+    return job
+
+async def get_job(job_id: str) -> Optional[dict]:
+    raw = await get_redis().hgetall(_job_key(job_id))
+    return _decode(raw) if raw else None
+
+def update_job(job_id: str, status: str, result=None, error: str = None, **fields):
+    """Record job progress from a worker and notify event subscribers."""
+    changes = {"status": status, "updated_at": datetime.utcnow().isoformat(), **fields}
+    if result is not None:
+        changes["result"] = json.dumps(result)
+    if error is not None:
+        changes["error"] = error
+
+    redis = get_sync_redis()
+    pipe = redis.pipeline()
+    pipe.hset(_job_key(job_id), mapping=changes)
+    pipe.expire(_job_key(job_id), JOB_TTL_SECONDS)
+    pipe.hgetall(_job_key(job_id))
+    job = _decode(pipe.execute()[-1])
+    redis.publish(_events_channel(job_id), json.dumps(job))
+
+async def job_events(job_id: str) -> AsyncIterator[Optional[dict]]:
+    """Yield the job state now and after every change until it finishes.
+
+    Yields None every KEEPALIVE_SECONDS without changes so that streaming
+    responses can keep the connection alive.
+    """
+    pubsub = get_redis().pubsub()
+    # Subscribe before reading the state so no transition is missed
+    await pubsub.subscribe(_events_channel(job_id))
+    try:
+        job = await get_job(job_id)
+        if not job:
+            return
+        yield job
+        while job["status"] not in TERMINAL_STATUSES:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=KEEPALIVE_SECONDS
+            )
+            if message is None:
+                yield None
+                continue
+            job = json.loads(message["data"])
+            yield job
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.close()
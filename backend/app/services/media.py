@@ -0,0 +1,77 @@
+from io import BytesIO
+from typing import Tuple
+from PIL import Image, ImageOps
+from ..core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Telegram photo limits: width + height <= 10000 and aspect ratio <= 20
+TELEGRAM_MAX_DIMENSIONS_SUM = 10000
+TELEGRAM_MAX_ASPECT_RATIO = 20
+
+MIN_QUALITY = 40
+MAX_QUALITY = 90
+
+def _load(data: bytes) -> Image.Image:
+    image = Image.open(BytesIO(data))
+    # Apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        # Keep any alpha (LA, PA, transparency keys) for _flatten to composite
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+def _flatten(image: Image.Image) -> Image.Image:
+    if image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image
+
+def _fit(image: Image.Image, max_side: int) -> Image.Image:
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height), TELEGRAM_MAX_DIMENSIONS_SUM / (width + height))
+    if scale < 1.0:
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+    return image
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    # Saving without exif/icc arguments strips the metadata
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, fmt, quality=quality, method=6)
+    return buffer.getvalue()
+
+def encode_within_budget(image: Image.Image, fmt: str, budget: int) -> bytes:
+    """Encode with the highest quality that fits in `budget` bytes
+    (binary search), or the lowest quality when nothing fits."""
+    low, high = MIN_QUALITY, MAX_QUALITY
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(image, fmt, quality)
+        if len(data) <= budget:
+            best = data
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best or _encode(image, fmt, MIN_QUALITY)
+
+def prepare_telegram_photo(data: bytes) -> Tuple[bytes, str]:
+    """Resize and recompress an image for send_photo; returns (jpeg, content type)."""
+    image = _load(data)
+    width, height = image.size
+    if max(width, height) / min(width, height) > TELEGRAM_MAX_ASPECT_RATIO:
+        logger.warning(f"Image aspect ratio {width}x{height} exceeds Telegram photo limits")
+    image = _flatten(_fit(image, settings.TELEGRAM_PHOTO_MAX_SIDE))
+    return encode_within_budget(image, "JPEG", settings.TELEGRAM_PHOTO_BUDGET_BYTES), "image/jpeg"
+
+def make_thumbnail(data: bytes) -> Tuple[bytes, str]:
+    """Small WebP preview for the dashboard post list."""
+    image = _load(data)
+    image.thumbnail((settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE), Image.LANCZOS)
+    return encode_within_budget(image, "WEBP", settings.THUMBNAIL_BUDGET_BYTES), "image/webp"
@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import List
+from beanie import PydanticObjectId
+from ..models.mongodb import Post
+
+# Per-post counters are denormalized on the posts documents by the metrics
+# tasks, so both pipelines run over the posts collection alone. Links are
+# stored as DBRefs, which $match can filter on ("channel.$id") but $lookup
+# cannot join on. Like the rollups, only posts with recorded metrics count.
+
+ENGAGEMENT = {"$add": ["$likes_count", "$comments_count", "$shares_count"]}
+
+def _match_channel_posts(channel_id: PydanticObjectId, start: datetime) -> dict:
+    return {"$match": {
+        "channel.$id": channel_id,
+        "created_at": {"$gte": start},
+        "metrics_recorded_at": {"$ne": None}
+    }}
+
+async def channel_totals(channel_id: PydanticObjectId, start: datetime) -> dict:
+    pipeline = [
+        _match_channel_posts(channel_id, start),
+        {"$group": {
+            "_id": None,
+            "posts": {"$sum": 1},
+            "views": {"$sum": "$views_count"},
+            "likes": {"$sum": "$likes_count"},
+            "comments": {"$sum": "$comments_count"},
+            "shares": {"$sum": "$shares_count"},
+            "engagement": {"$sum": ENGAGEMENT},
+            "ctr_sum": {"$sum": "$ctr"},
+        }},
+        {"$project": {"_id": 0}},
+    ]
+    result = await Post.get_motor_collection().aggregate(pipeline).to_list(length=1)
+    return result[0] if result else {
+        "posts": 0, "views": 0, "likes": 0, "comments": 0,
+        "shares": 0, "engagement": 0, "ctr_sum": 0.0
+    }
+
+async def top_posts(channel_id: PydanticObjectId, start: datetime, limit: int) -> List[dict]:
+    pipeline = [
+        _match_channel_posts(channel_id, start),
+        {"$addFields": {"engagement": ENGAGEMENT}},
+        {"$sort": {"engagement": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "views_count": 1,
+            "likes_count": 1,
+            "shares_count": 1,
+            "comments_count": 1,
+            "ctr": 1,
+            "created_at": 1,
+            "updated_at": 1,
+        }},
+    ]
+    return await Post.get_motor_collection().aggregate(pipeline).to_list(length=limit)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Tuple
+from pymongo import UpdateOne
+from ..core.mongodb import get_database
+from ..models.mongodb import ChannelMetricsRollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+COUNTERS = ("posts", "views", "likes", "comments", "shares", "engagement", "ctr_sum")
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def metrics_delta(old: dict, new: dict, is_new_post: bool = False) -> dict:
+    """Counter increments for a post whose metrics changed from old to new."""
+    delta = {
+        field: (new.get(field) or 0) - (old.get(field) or 0)
+        for field in ("views", "likes", "comments", "shares")
+    }
+    delta["engagement"] = delta["likes"] + delta["comments"] + delta["shares"]
+    delta["ctr_sum"] = (new.get("ctr") or 0) - (old.get("ctr") or 0)
+    delta["posts"] = 1 if is_new_post else 0
+    return {field: value for field, value in delta.items() if value}
+
+async def record_metrics(channel_id: str, updates: Iterable[Tuple[datetime, dict]]):
+    """Apply (post created_at, delta) pairs to the hourly and daily buckets."""
+    increments = {}
+    for created_at, delta in updates:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(created_at, granularity))
+            bucket = increments.setdefault(key, {})
+            for field, value in delta.items():
+                bucket[field] = bucket.get(field, 0) + value
+
+    operations = [
+        UpdateOne(
+            {"channel": channel_id, "granularity": granularity, "bucket": bucket},
+            {"$inc": inc},
+            upsert=True
+        )
+        for (granularity, bucket), inc in increments.items()
+        if inc
+    ]
+    if not operations:
+        return
+
+    db = await get_database()
+    await db[ChannelMetricsRollup.Settings.name].bulk_write(operations, ordered=False)
+
+async def get_channel_totals(channel_id: str, start: datetime, end: datetime) -> dict:
+    """Sum the buckets covering [start, end]: hourly buckets up to the first
+    day boundary, daily buckets after it."""
+    first_day = bucket_start(start, "day")
+    if first_day < start:
+        first_day += timedelta(days=1)
+
+    pipeline = [
+        {"$match": {
+            "channel": channel_id,
+            "$or": [
+                {"granularity": "hour", "bucket": {"$gte": bucket_start(start, "hour"), "$lt": first_day}},
+                {"granularity": "day", "bucket": {"$gte": first_day, "$lte": end}},
+            ]
+        }},
+        {"$group": {"_id": None, **{field: {"$sum": f"${field}"} for field in COUNTERS}}},
+    ]
+
+    db = await get_database()
+    result = await db[ChannelMetricsRollup.Settings.name].aggregate(pipeline).to_list(length=1)
+    totals = result[0] if result else {}
+    return {field: totals.get(field, 0) for field in COUNTERS}
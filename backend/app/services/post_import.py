@@ -0,0 +1,179 @@
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+from beanie import Link, PydanticObjectId
+from bson import DBRef
+from pydantic import ValidationError
+from ..core.config import settings
+from ..models.mongodb import Channel, Post, PostStatus, User
+from ..schemas.post import PostImportRow
+import codecs
+import csv
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines, keeping only the current line in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def _ndjson_records(chunks: AsyncIterator[bytes]):
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+async def _csv_records(chunks: AsyncIterator[bytes]):
+    header = None
+    record, start, number = "", 0, 0
+    async for line in _lines(chunks):
+        number += 1
+        if not record:
+            start = number
+        record += line
+        # Quoted fields may span lines; a record is complete once its
+        # quotes are balanced (escaped quotes come in pairs)
+        if record.count('"') % 2:
+            continue
+
+        values, record = next(csv.reader([record]), []), ""
+        if not any(v.strip() for v in values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start, {name: value for name, value in zip(header, values) if value != ""}, None
+
+    if record:
+        yield start, None, "Unterminated quoted field"
+
+def _link(document_class, document_id) -> Link:
+    return Link(DBRef(document_class.get_collection_name(), document_id), document_class)
+
+class ImportReport:
+    """Per-row outcome of an import, keeping at most POST_IMPORT_MAX_ERRORS errors."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < settings.POST_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+async def import_posts(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    user_id: str,
+    enqueue: Callable[[Dict[str, datetime]], Awaitable[None]]
+) -> dict:
+    """Validate and insert posts from a CSV or NDJSON stream.
+
+    Valid rows are inserted with insert_many every POST_IMPORT_BATCH_SIZE
+    rows; enqueue is awaited with the ids (assigned up front) and due times
+    of the scheduled posts of each batch. Invalid rows are skipped and
+    reported by line number.
+    """
+    records = _csv_records(chunks) if fmt == "csv" else _ndjson_records(chunks)
+    author = _link(User, PydanticObjectId(user_id))
+    channels = {
+        str(channel.id): _link(Channel, channel.id)
+        async for channel in Channel.find(Channel.owner.id == PydanticObjectId(user_id))
+    }
+    report = ImportReport()
+    batch: List[tuple] = []
+
+    async def flush():
+        posts = [post for _, post in batch]
+        try:
+            await Post.insert_many(posts)
+        except Exception as e:
+            logger.error(f"Error inserting imported posts: {e}")
+            for line, _ in batch:
+                report.fail(line, "Failed to save post")
+        else:
+            report.imported += len(posts)
+            scheduled = {
+                str(post.id): post.scheduled_for
+                for post in posts if post.status == PostStatus.SCHEDULED
+            }
+            if scheduled:
+                try:
+                    await enqueue(scheduled)
+                except Exception as e:
+                    logger.error(f"Error scheduling imported posts: {e}")
+        batch.clear()
+
+    async for line, record, error in records:
+        if error:
+            report.fail(line, error)
+            continue
+        try:
+            row = PostImportRow.model_validate(record)
+        except ValidationError as e:
+            report.fail(line, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+                for err in e.errors()
+            ))
+            continue
+
+        channel = channels.get(row.channel_id)
+        if channel is None:
+            report.fail(line, "channel_id: Channel not found")
+            continue
+
+        now = datetime.utcnow()
+        batch.append((line, Post(
+            id=PydanticObjectId(),
+            title=row.title,
+            description=row.description,
+            content=row.content,
+            status=row.status,
+            media_urls=row.media_urls,
+            author=author,
+            channel=channel,
+            scheduled_for=row.scheduled_for,
+            published_at=None,
+            created_at=now,
+            updated_at=now
+        )))
+        if len(batch) >= settings.POST_IMPORT_BATCH_SIZE:
+            await flush()
+
+    if batch:
+        await flush()
+    return report.as_dict()
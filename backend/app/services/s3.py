@@ -1,7 +1,13 @@
+import asyncio
 import boto3
+import hashlib
 from ..core.config import settings
+from ..core.redis import get_sync_redis
 import logging
 from botocore.exceptions import ClientError
+from collections import OrderedDict
+from redis.exceptions import RedisError
+from typing import AsyncIterator, Awaitable, Callable
 
 logger = logging.getLogger(__name__)
 
@@ -12,18 +18,278 @@ s3_client = boto3.client(
     region_name=settings.AWS_REGION
 )
 
-def upload_to_s3(file_data: bytes, key: str) -> str:
+# S3 requires every part but the last to be at least 5 MB
+MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+# Content-addressed objects live under blobs/ and are shared by every post
+# that uses the same bytes. Redis keeps a reference count per object.
+BLOB_PREFIX = "blobs/"
+BLOB_LOCK_TIMEOUT = 30
+
+# Blob keys this process has seen in the bucket, most recent last
+_known_blobs = OrderedDict()
+
+class UploadTooLargeError(Exception):
+    pass
+
+def _object_url(key: str) -> str:
+    return f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+
+def upload_to_s3(file_data: bytes, key: str, content_type: str = None) -> str:
+    extra = {"ContentType": content_type} if content_type else {}
     try:
         s3_client.put_object(
             Bucket=settings.S3_BUCKET,
             Key=key,
-            Body=file_data
+            Body=file_data,
+            **extra
         )
-        return f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+        return _object_url(key)
     except ClientError as e:
         logger.error(f"Error uploading to S3: {e}")
         return ""
 
+def blob_key(file_data: bytes, extension: str) -> str:
+    digest = hashlib.sha256(file_data).hexdigest()
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest}.{extension}"
+
+def is_blob_key(key: str) -> bool:
+    return bool(key) and key.startswith(BLOB_PREFIX)
+
+def _remember_blob(key: str):
+    _known_blobs[key] = None
+    _known_blobs.move_to_end(key)
+    while len(_known_blobs) > settings.S3_BLOB_INDEX_SIZE:
+        _known_blobs.popitem(last=False)
+
+def _blob_exists(key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=settings.S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    _remember_blob(key)
+    return True
+
+def _refs_key(key: str) -> str:
+    return f"s3:refs:{key}"
+
+def _blob_lock(key: str):
+    return get_sync_redis().lock(
+        f"s3:lock:{key}",
+        timeout=BLOB_LOCK_TIMEOUT,
+        blocking_timeout=BLOB_LOCK_TIMEOUT
+    )
+
+def _put_blob(file_data: bytes, key: str, content_type: str = None) -> bool:
+    if _blob_exists(key):
+        return True
+    extra = {"ContentType": content_type} if content_type else {}
+    s3_client.put_object(
+        Bucket=settings.S3_BUCKET,
+        Key=key,
+        Body=file_data,
+        **extra
+    )
+    _remember_blob(key)
+    return True
+
+def upload_blob(file_data: bytes, extension: str, content_type: str = None) -> str:
+    """Store file_data under a key derived from its content and take a
+    reference to it.
+
+    Bytes that are already in the bucket are not uploaded again. Every
+    call must be balanced by a delete_from_s3 of the returned object.
+    """
+    key = blob_key(file_data, extension)
+    try:
+        try:
+            refs = get_sync_redis().incr(_refs_key(key))
+        except RedisError as e:
+            logger.warning(f"S3 reference counts unavailable: {e}")
+            _put_blob(file_data, key, content_type)
+            return _object_url(key)
+        
+        if refs > 1 and key in _known_blobs:
+            _known_blobs.move_to_end(key)
+            return _object_url(key)
+        
+        # First reference: the object may be missing or still being removed
+        # by the release of its previous last reference
+        try:
+            with _blob_lock(key):
+                _put_blob(file_data, key, content_type)
+        except RedisError as e:
+            logger.warning(f"S3 blob lock unavailable: {e}")
+            _put_blob(file_data, key, content_type)
+        return _object_url(key)
+    except ClientError as e:
+        logger.error(f"Error uploading to S3: {e}")
+        return ""
+
+def retain_blob(url: str) -> str:
+    """Take one more reference to the content-addressed object behind url.
+
+    Returns "" (without a reference) when the object was deleted because
+    nothing referred to it anymore.
+    """
+    key = key_from_url(url)
+    if not is_blob_key(key):
+        return url
+    try:
+        redis = get_sync_redis()
+        if redis.incr(_refs_key(key)) > 1:
+            return url
+        # Ours is the only reference: the object may be gone or still being
+        # removed by the release of its previous last reference
+        with _blob_lock(key):
+            if _blob_exists(key):
+                return url
+            redis.decr(_refs_key(key))
+            return ""
+    except RedisError as e:
+        logger.warning(f"S3 reference counts unavailable: {e}")
+        return url
+    except ClientError as e:
+        logger.error(f"Error checking S3 object: {e}")
+        return url
+
+def release_blob(url: str):
+    """Drop a reference taken by upload_blob or retain_blob. URLs of other
+    objects are left alone."""
+    key = key_from_url(url)
+    if is_blob_key(key):
+        delete_from_s3(key)
+
+def chunk_reader(chunks: AsyncIterator[bytes]) -> Callable[[int], Awaitable[bytes]]:
+    """Adapt a stream of chunks of any size, such as Request.stream(), to
+    the read(size) callable upload_stream_to_s3 expects."""
+    iterator = chunks.__aiter__()
+    pending = b""
+
+    async def read(size: int) -> bytes:
+        nonlocal pending
+        while len(pending) < size:
+            try:
+                pending += await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+        data, pending = pending[:size], pending[size:]
+        return data
+
+    return read
+
+async def _read_part(read: Callable[[int], Awaitable[bytes]]) -> bytes:
+    part = b""
+    while len(part) < MULTIPART_PART_SIZE:
+        chunk = await read(MULTIPART_PART_SIZE - len(part))
+        if not chunk:
+            break
+        part += chunk
+    return part
+
+async def upload_stream_to_s3(
+    read: Callable[[int], Awaitable[bytes]],
+    key: str,
+    max_size: int,
+    content_type: str = None,
+    extension: str = None
+) -> str:
+    """Upload from an async reader holding at most one part in memory.
+
+    Small bodies go up with a single put; larger ones use a multipart upload.
+    Blocking boto3 calls run in worker threads. Raises UploadTooLargeError
+    (after aborting the upload) as soon as more than max_size bytes arrive.
+    With an extension, small bodies are stored content-addressed (see
+    upload_blob) instead of under key.
+    """
+    extra = {"ContentType": content_type} if content_type else {}
+    part = await _read_part(read)
+    if len(part) > max_size:
+        raise UploadTooLargeError(key)
+    if len(part) < MULTIPART_PART_SIZE and extension:
+        return await asyncio.to_thread(upload_blob, part, extension, content_type)
+    if len(part) < MULTIPART_PART_SIZE:
+        try:
+            await asyncio.to_thread(
+                s3_client.put_object,
+                Bucket=settings.S3_BUCKET,
+                Key=key,
+                Body=part,
+                **extra
+            )
+            return _object_url(key)
+        except ClientError as e:
+            logger.error(f"Error uploading to S3: {e}")
+            return ""
+
+    upload_id = None
+    try:
+        upload = await asyncio.to_thread(
+            s3_client.create_multipart_upload,
+            Bucket=settings.S3_BUCKET,
+            Key=key,
+            **extra
+        )
+        upload_id = upload["UploadId"]
+        parts = []
+        total = 0
+        while part:
+            total += len(part)
+            if total > max_size:
+                raise UploadTooLargeError(key)
+            response = await asyncio.to_thread(
+                s3_client.upload_part,
+                Bucket=settings.S3_BUCKET,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=len(parts) + 1,
+                Body=part
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+            part = await _read_part(read)
+
+        await asyncio.to_thread(
+            s3_client.complete_multipart_upload,
+            Bucket=settings.S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+        return _object_url(key)
+    except (ClientError, UploadTooLargeError) as e:
+        if upload_id:
+            try:
+                await asyncio.to_thread(
+                    s3_client.abort_multipart_upload,
+                    Bucket=settings.S3_BUCKET,
+                    Key=key,
+                    UploadId=upload_id
+                )
+            except ClientError as abort_error:
+                logger.error(f"Error aborting S3 upload: {abort_error}")
+        if isinstance(e, UploadTooLargeError):
+            raise
+        logger.error(f"Error uploading to S3: {e}")
+        return ""
+
+def key_from_url(url: str) -> str:
+    """S3 key of one of our object URLs, or "" for any other URL."""
+    prefix = _object_url("")
+    return url[len(prefix):] if url and url.startswith(prefix) else ""
+
+def download_from_s3(key: str) -> bytes:
+    try:
+        response = s3_client.get_object(
+            Bucket=settings.S3_BUCKET,
+            Key=key
+        )
+        return response["Body"].read()
+    except ClientError as e:
+        logger.error(f"Error downloading from S3: {e}")
+        return b""
+
 def get_s3_url(key: str) -> str:
     try:
         url = s3_client.generate_presigned_url(
@@ -40,6 +306,29 @@ def get_s3_url(key: str) -> str:
         return ""
 
 def delete_from_s3(key: str) -> bool:
+    """Delete an object. Content-addressed objects lose one reference and
+    are only removed once nothing refers to them anymore."""
+    if is_blob_key(key):
+        try:
+            with _blob_lock(key):
+                redis = get_sync_redis()
+                # The counter stays behind at zero so a reference taken
+                # concurrently is not lost
+                if redis.decr(_refs_key(key)) > 0:
+                    return True
+                _known_blobs.pop(key, None)
+                s3_client.delete_object(
+                    Bucket=settings.S3_BUCKET,
+                    Key=key
+                )
+            return True
+        except RedisError as e:
+            # Without the count the object may still be in use: keep it
+            logger.warning(f"S3 reference counts unavailable, keeping {key}: {e}")
+            return False
+        except ClientError as e:
+            logger.error(f"Error deleting from S3: {e}")
+            return False
     try:
         s3_client.delete_object(
             Bucket=settings.S3_BUCKET,
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from typing import Dict, List
+from ..core.redis import get_redis, get_sync_redis
+
+# Due posts: member post id, score due time (unix seconds)
+SCHEDULE_KEY = "posts:schedule"
+# Posts handed to the dispatcher but not yet confirmed as enqueued: score is
+# the time after which they count as due again
+DISPATCHING_KEY = "posts:schedule:dispatching"
+
+# KEYS: schedule, dispatching  ARGV: now, batch size, lease deadline
+# Takes due posts (and posts whose dispatch lease ran out) and leases them.
+TAKE_DUE_SCRIPT = """
+local now, limit = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, limit)
+if #ids < limit then
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, limit - #ids)
+    for _, id in ipairs(due) do
+        table.insert(ids, id)
+    end
+end
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('ZADD', KEYS[2], ARGV[3], id)
+end
+return ids
+"""
+
+_take_due = None
+
+def _score(when: datetime) -> float:
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+def schedule(post_id: str, when: datetime):
+    """Publish post_id at `when`; scheduling again just moves the due time."""
+    get_sync_redis().zadd(SCHEDULE_KEY, {str(post_id): _score(when)})
+
+async def schedule_many(due: Dict[str, datetime]):
+    """Publish each post id at its due time, all in a single ZADD."""
+    if due:
+        await get_redis().zadd(SCHEDULE_KEY, {str(post_id): _score(when) for post_id, when in due.items()})
+
+async def reschedule(post_id: str, when: datetime) -> bool:
+    """Move the due time of an already scheduled post. Returns False when
+    the post is not waiting in the schedule."""
+    redis = get_redis()
+    if await redis.zscore(SCHEDULE_KEY, str(post_id)) is None:
+        return False
+    # XX: never re-add a post the dispatcher took in the meantime
+    await redis.zadd(SCHEDULE_KEY, {str(post_id): _score(when)}, xx=True)
+    return True
+
+async def unschedule(post_id: str):
+    await get_redis().zrem(SCHEDULE_KEY, str(post_id))
+
+def take_due(limit: int, lease_seconds: int) -> List[str]:
+    """Lease up to `limit` due posts to the caller, who must call
+    confirm_dispatched once they are handed over to the publish workers."""
+    global _take_due
+    if _take_due is None:
+        _take_due = get_sync_redis().register_script(TAKE_DUE_SCRIPT)
+    now = datetime.now(timezone.utc).timestamp()
+    ids = _take_due(keys=[SCHEDULE_KEY, DISPATCHING_KEY], args=[now, limit, now + lease_seconds])
+    return [post_id.decode() for post_id in ids]
+
+def confirm_dispatched(post_ids: List[str]):
+    if post_ids:
+        get_sync_redis().zrem(DISPATCHING_KEY, *post_ids)
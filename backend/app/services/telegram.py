@@ -1,17 +1,282 @@
 from aiogram import Bot, types
-from aiogram.types import ChatMemberAdministrator
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import ChatMemberAdministrator, InputMediaPhoto, InputMediaVideo
+from enum import IntEnum
+from typing import List
+from redis.exceptions import RedisError
 from ..core.config import settings
+from ..core.redis import get_redis
+from .s3 import is_blob_key, key_from_url
+import asyncio
+import hashlib
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+class RequestPriority(IntEnum):
+    PUBLISH = 0
+    DEFAULT = 1
+    METRICS = 2
+
+# sendMediaGroup takes 2-10 items; captions of media are limited to 1024
+MEDIA_GROUP_MAX_ITEMS = 10
+MEDIA_CAPTION_MAX_LENGTH = 1024
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".webm")
+
+def is_video_url(url: str) -> bool:
+    return url.split("?", 1)[0].lower().endswith(VIDEO_EXTENSIONS)
+
+def media_group_chunks(items: list) -> List[list]:
+    """Split items into as few albums as possible of nearly equal size, so
+    that no album is left with a single item."""
+    count = -(-len(items) // MEDIA_GROUP_MAX_ITEMS)
+    size, extra = divmod(len(items), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+# Waiting tickets that have not been refreshed for this long belong to a
+# worker that went away and no longer hold back lower priorities.
+WAITER_STALE_MS = 5000
+
+# KEYS: global bucket, chat bucket, chat flood key, own waiting set,
+#       waiting sets of every higher priority
+# ARGV: ticket, global rate (tokens/ms), global burst,
+#       chat rate (tokens/ms), chat burst, 1 if the call counts per chat,
+#       WAITER_STALE_MS, cost (tokens the call takes)
+# Returns 0 once the tokens are taken, otherwise the number of ms to wait.
+# Only a call held back by the global bucket registers as waiting, so that
+# a flood window or the bucket of one chat never stalls lower priorities
+# for every other chat.
+# A call costing more than a burst waits for a full bucket and leaves it in
+# debt, so that the calls after it wait until the debt is paid off.
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local ticket = ARGV[1]
+
+local function wait_for_global(wait)
+    redis.call('ZADD', KEYS[4], now, ticket)
+    redis.call('PEXPIRE', KEYS[4], 60000)
+    return wait
+end
+
+local function wait_for(wait)
+    redis.call('ZREM', KEYS[4], ticket)
+    return wait
+end
+
+local flood = redis.call('PTTL', KEYS[3])
+if flood > 0 then
+    return wait_for(flood)
+end
+
+for i = 5, #KEYS do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - tonumber(ARGV[7]))
+    if redis.call('ZCARD', KEYS[i]) > 0 then
+        return wait_for(50)
+    end
+end
+
+local function refill(key, rate, burst)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    return math.min(burst, tokens + (now - ts) * rate)
+end
+
+local cost = tonumber(ARGV[8])
+local function shortfall(tokens, rate, burst)
+    local need = math.min(cost, burst)
+    if tokens < need then
+        return math.ceil((need - tokens) / rate)
+    end
+    return 0
+end
+
+local global_rate, global_burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local global_tokens = refill(KEYS[1], global_rate, global_burst)
+local global_wait = shortfall(global_tokens, global_rate, global_burst)
+
+local per_chat = ARGV[6] == '1'
+local chat_rate, chat_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local chat_tokens, chat_wait = 0, 0
+if per_chat then
+    chat_tokens = refill(KEYS[2], chat_rate, chat_burst)
+    chat_wait = shortfall(chat_tokens, chat_rate, chat_burst)
+end
+
+if chat_wait > 0 and chat_wait >= global_wait then
+    return wait_for(chat_wait)
+end
+if global_wait > 0 then
+    return wait_for_global(global_wait)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', global_tokens - cost, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((global_burst + cost) / global_rate) + 1000)
+if per_chat then
+    redis.call('HSET', KEYS[2], 'tokens', chat_tokens - cost, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], math.ceil((chat_burst + cost) / chat_rate) + 1000)
+end
+redis.call('ZREM', KEYS[4], ticket)
+return 0
+"""
+
+class TelegramRateLimiter:
+    """Bot API rate limiter shared by every API and worker process via Redis.
+
+    Combines a global token bucket, a per-chat bucket for outgoing messages,
+    flood-wait windows reported by Telegram and strict priority between
+    request classes: a request only proceeds while no higher-priority
+    request is waiting.
+    """
+    
+    def __init__(self, prefix: str = "telegram:ratelimit"):
+        self.prefix = prefix
+        self._script = None
+    
+    def _waiting_key(self, priority: RequestPriority) -> str:
+        return f"{self.prefix}:waiting:{int(priority)}"
+    
+    async def acquire(
+        self,
+        chat_id: str,
+        priority: RequestPriority,
+        per_chat: bool = False,
+        cost: int = 1
+    ):
+        """Wait until the call may proceed. cost is the number of messages
+        it sends, e.g. the items of an album, which Telegram counts one by one."""
+        redis = get_redis()
+        if self._script is None:
+            self._script = redis.register_script(ACQUIRE_SCRIPT)
+
+        ticket = uuid.uuid4().hex
+        keys = [
+            f"{self.prefix}:global",
+            f"{self.prefix}:chat:{chat_id}",
+            f"{self.prefix}:flood:{chat_id}",
+            self._waiting_key(priority),
+        ] + [self._waiting_key(p) for p in RequestPriority if p < priority]
+        args = [
+            ticket,
+            settings.TELEGRAM_GLOBAL_RATE_PER_SECOND / 1000,
+            settings.TELEGRAM_GLOBAL_BURST,
+            settings.TELEGRAM_CHAT_RATE_PER_MINUTE / 60000,
+            settings.TELEGRAM_CHAT_BURST,
+            1 if per_chat else 0,
+            WAITER_STALE_MS,
+            cost,
+        ]
+
+        try:
+            while True:
+                wait_ms = await self._script(keys=keys, args=args)
+                if not wait_ms:
+                    return
+                # Wake up at least every second to keep the ticket fresh
+                await asyncio.sleep(min(int(wait_ms), 1000) / 1000)
+        except RedisError as e:
+            # Never block publishing because the limiter is unavailable
+            logger.warning(f"Telegram rate limiter unavailable: {e}")
+    
+    async def flood_wait(self, chat_id: str, retry_after: int):
+        try:
+            await get_redis().set(
+                f"{self.prefix}:flood:{chat_id}",
+                1,
+                px=int(retry_after * 1000)
+            )
+        except RedisError as e:
+            logger.warning(f"Telegram rate limiter unavailable: {e}")
+            await asyncio.sleep(retry_after)
+
+class TelegramFileIdCache:
+    """Maps media URLs to the file_id Telegram assigned on the first upload.
+
+    Sending a file_id instead of a URL spares Telegram the download from
+    S3. Only content-addressed URLs are cached, which makes this a cache by
+    content hash: the bytes behind any other URL may change without it.
+    """
+    
+    def __init__(self, prefix: str = "telegram:file_id"):
+        self.prefix = prefix
+    
+    def _key(self, url: str) -> str:
+        return f"{self.prefix}:{hashlib.sha1(url.encode()).hexdigest()}"
+    
+    @staticmethod
+    def _cacheable(url: str) -> bool:
+        return is_blob_key(key_from_url(url))
+    
+    async def get(self, url: str):
+        if not self._cacheable(url):
+            return None
+        try:
+            file_id = await get_redis().get(self._key(url))
+            return file_id.decode() if file_id else None
+        except RedisError as e:
+            logger.warning(f"Telegram file_id cache unavailable: {e}")
+            return None
+    
+    async def set(self, url: str, file_id: str):
+        if not self._cacheable(url):
+            return
+        try:
+            await get_redis().set(
+                self._key(url),
+                file_id,
+                ex=settings.TELEGRAM_FILE_ID_TTL_SECONDS
+            )
+        except RedisError as e:
+            logger.warning(f"Telegram file_id cache unavailable: {e}")
+    
+    async def forget(self, url: str):
+        try:
+            await get_redis().delete(self._key(url))
+        except RedisError as e:
+            logger.warning(f"Telegram file_id cache unavailable: {e}")
+
 class TelegramService:
     def __init__(self):
         self.bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        self.limiter = TelegramRateLimiter()
+        self.file_ids = TelegramFileIdCache()
     
-    async def get_channel_info(self, channel_id: str) -> dict:
+    async def _request(
+        self,
+        call,
+        chat_id: str,
+        priority: RequestPriority,
+        per_chat: bool = False,
+        cost: int = 1
+    ):
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            await self.limiter.acquire(chat_id, priority, per_chat, cost)
+            try:
+                return await call()
+            except TelegramRetryAfter as e:
+                if attempt >= settings.TELEGRAM_MAX_RETRIES:
+                    raise
+                logger.warning(f"Flood wait for chat {chat_id}: retry after {e.retry_after}s")
+                await self.limiter.flood_wait(chat_id, e.retry_after)
+    
+    async def get_channel_info(
+        self,
+        channel_id: str,
+        priority: RequestPriority = RequestPriority.DEFAULT
+    ) -> dict:
         try:
-            chat = await self.bot.get_chat(channel_id)
+            chat = await self._request(
+                lambda: self.bot.get_chat(channel_id),
+                channel_id,
+                priority
+            )
             return {
                 "id": str(chat.id),
                 "title": chat.title,
@@ -23,9 +288,24 @@ class TelegramService:
             logger.error(f"Error getting channel info: {e}")
             raise
     
+    async def get_member_count(
+        self,
+        channel_id: str,
+        priority: RequestPriority = RequestPriority.METRICS
+    ) -> int:
+        return await self._request(
+            lambda: self.bot.get_chat_member_count(channel_id),
+            channel_id,
+            priority
+        )
+    
     async def check_bot_admin(self, channel_id: str) -> bool:
         try:
-            chat_member = await self.bot.get_chat_member(channel_id, self.bot.id)
+            chat_member = await self._request(
+                lambda: self.bot.get_chat_member(channel_id, self.bot.id),
+                channel_id,
+                RequestPriority.DEFAULT
+            )
             return isinstance(chat_member, ChatMemberAdministrator)
         except Exception as e:
             logger.error(f"Error checking bot admin status: {e}")
@@ -36,32 +316,158 @@ class TelegramService:
         channel_id: str,
         text: str,
         image_url: str = None,
-        parse_mode: str = "HTML"
+        parse_mode: str = "HTML",
+        priority: RequestPriority = RequestPriority.PUBLISH
     ) -> str:
-        try:
-            if image_url:
-                # Download and send image with caption
-                message = await self.bot.send_photo(
+        def send_photo(photo: str):
+            return self._request(
+                lambda: self.bot.send_photo(
                     chat_id=channel_id,
-                    photo=image_url,
+                    photo=photo,
                     caption=text,
                     parse_mode=parse_mode
-                )
+                ),
+                channel_id,
+                priority,
+                per_chat=True
+            )
+        
+        try:
+            if image_url:
+                # Reuse the file Telegram already has, if any
+                message = None
+                file_id = await self.file_ids.get(image_url)
+                if file_id:
+                    try:
+                        message = await send_photo(file_id)
+                    except TelegramBadRequest as e:
+                        logger.warning(f"Cached file_id for {image_url} rejected: {e}")
+                        await self.file_ids.forget(image_url)
+                
+                if message is None:
+                    # Let Telegram download the image and keep its file_id
+                    message = await send_photo(image_url)
+                    if message.photo:
+                        await self.file_ids.set(image_url, message.photo[-1].file_id)
             else:
                 # Send text only
-                message = await self.bot.send_message(
-                    chat_id=channel_id,
-                    text=text,
-                    parse_mode=parse_mode
+                message = await self._request(
+                    lambda: self.bot.send_message(
+                        chat_id=channel_id,
+                        text=text,
+                        parse_mode=parse_mode
+                    ),
+                    channel_id,
+                    priority,
+                    per_chat=True
                 )
             return str(message.message_id)
         except Exception as e:
             logger.error(f"Error sending message: {e}")
             raise
     
-    async def get_channel_stats(self, channel_id: str, message_id: str) -> dict:
+    async def send_media_group(
+        self,
+        channel_id: str,
+        media_urls: List[str],
+        text: str = None,
+        parse_mode: str = "HTML",
+        priority: RequestPriority = RequestPriority.PUBLISH
+    ) -> str:
+        """Send photos and videos as albums of up to ten items each.
+
+        The text goes into the caption of the first item, or into a message
+        of its own when it is too long for a caption. Returns the id of the
+        first message sent.
+        """
+        if len(media_urls) < 2:
+            return await self.send_message(
+                channel_id,
+                text,
+                image_url=media_urls[0] if media_urls else None,
+                parse_mode=parse_mode,
+                priority=priority
+            )
+        
+        try:
+            first_message_id = None
+            caption = text
+            if text and len(text) > MEDIA_CAPTION_MAX_LENGTH:
+                first_message_id = await self.send_message(
+                    channel_id,
+                    text,
+                    parse_mode=parse_mode,
+                    priority=priority
+                )
+                caption = None
+            
+            for chunk in media_group_chunks(media_urls):
+                messages = await self._send_album(channel_id, chunk, caption, parse_mode, priority)
+                if first_message_id is None:
+                    first_message_id = str(messages[0].message_id)
+                caption = None
+            return first_message_id
+        except Exception as e:
+            logger.error(f"Error sending media group: {e}")
+            raise
+    
+    async def _send_album(
+        self,
+        channel_id: str,
+        urls: List[str],
+        caption: str,
+        parse_mode: str,
+        priority: RequestPriority
+    ) -> list:
+        file_ids = await asyncio.gather(*(self.file_ids.get(url) for url in urls))
+        
+        def build(sources):
+            media = []
+            for i, (url, source) in enumerate(zip(urls, sources)):
+                media_type = InputMediaVideo if is_video_url(url) else InputMediaPhoto
+                extra = {"caption": caption, "parse_mode": parse_mode} if i == 0 and caption else {}
+                media.append(media_type(media=source, **extra))
+            return media
+        
+        def send(media):
+            return self._request(
+                lambda: self.bot.send_media_group(chat_id=channel_id, media=media),
+                channel_id,
+                priority,
+                per_chat=True,
+                cost=len(media)
+            )
+        
+        cached = [file_id or url for url, file_id in zip(urls, file_ids)]
+        if any(file_ids):
+            try:
+                return await send(build(cached))
+            except TelegramBadRequest as e:
+                # One stale file_id fails the whole album: fall back to URLs
+                logger.warning(f"Cached file_ids for album rejected: {e}")
+                for url, file_id in zip(urls, file_ids):
+                    if file_id:
+                        await self.file_ids.forget(url)
+        
+        messages = await send(build(urls))
+        for url, message in zip(urls, messages):
+            media = message.video if message.video else (message.photo[-1] if message.photo else None)
+            if media:
+                await self.file_ids.set(url, media.file_id)
+        return messages
+    
+    async def get_channel_stats(
+        self,
+        channel_id: str,
+        message_id: str,
+        priority: RequestPriority = RequestPriority.METRICS
+    ) -> dict:
         try:
-            message = await self.bot.get_message(channel_id, int(message_id))
+            message = await self._request(
+                lambda: self.bot.get_message(channel_id, int(message_id)),
+                channel_id,
+                priority
+            )
             return {
                 "views": message.views if hasattr(message, 'views') else 0,
                 "forwards": message.forward_count if hasattr(message, 'forward_count') else 0,
@@ -78,4 +484,4 @@ class TelegramService:
     async def close(self):
         await self.bot.session.close()
 
-telegram_service = TelegramService() 
\ No newline at end of file
+telegram_service = TelegramService()
@@ -1,148 +1,332 @@
 from celery import shared_task
-from sqlalchemy.orm import Session
-from datetime import datetime
+from beanie import PydanticObjectId
+from pymongo import ASCENDING, UpdateOne
+from collections import defaultdict
+from datetime import datetime, timedelta
+import asyncio
 import logging
-from .db.session import SessionLocal
-from .models.post import Post
-from .models.channel import TelegramChannel
-from .models.metrics import PostMetrics, ChannelMetrics
+import requests
+import zlib
+from .core.async_runtime import run_async, run_batch
+from .core.cache import channel_scope, invalidate
+from .core.config import settings
+from .models.mongodb import Channel as ChannelDocument, ChannelMetrics, Post as PostDocument, PostStatus
 from .services.telegram import telegram_service
-from .services.gpt import generate_content, generate_image
-from .services.s3 import upload_to_s3
+from .services.metrics_rollup import metrics_delta, record_metrics
+from .services import gpt
+from .services.jobs import update_job
+from .services import media
+from .services import email as email_service
+from .services import scheduler
+from .services.s3 import download_from_s3, key_from_url, upload_blob, retain_blob, release_blob
 
 logger = logging.getLogger(__name__)
 
+# (max post age, refresh interval): young posts are refreshed often, older
+# ones less and less; posts older than the last band are no longer refreshed.
+METRICS_REFRESH_CURVE = [
+    (timedelta(hours=1), timedelta(minutes=5)),
+    (timedelta(days=1), timedelta(hours=1)),
+    (timedelta(days=7), timedelta(hours=6)),
+    (timedelta(days=30), timedelta(days=1)),
+]
+
+def metrics_shard(channel_id) -> int:
+    return zlib.crc32(str(channel_id).encode()) % settings.METRICS_SHARDS
+
+def load_post(post_id: str):
+    """The post document, or None when there is no such post."""
+    if not PydanticObjectId.is_valid(post_id):
+        return None
+    return run_async(PostDocument.get(PydanticObjectId(post_id)))
+
+def update_post(post_id, values: dict, status: PostStatus = None) -> bool:
+    """Set values on a post, only if it is still in status when given.
+
+    Returns whether the post matched. Query-level updates skip the touch
+    hook, so updated_at is set here.
+    """
+    query = {"_id": PydanticObjectId(post_id)}
+    if status:
+        query["status"] = status.value
+    result = run_async(PostDocument.get_motor_collection().update_one(
+        query,
+        {"$set": {**values, "updated_at": datetime.utcnow()}}
+    ))
+    return result.matched_count == 1
+
 @shared_task
 def schedule_post(post_id: str):
-    db = SessionLocal()
+    """Prepare a scheduled post and put it into the schedule."""
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
-        if not post or post.status != 'approved':
-            return
-        
-        channel = db.query(TelegramChannel).filter(TelegramChannel.id == post.channel_id).first()
-        if not channel or not channel.is_active:
+        post = load_post(post_id)
+        if not post or post.status != PostStatus.SCHEDULED or not post.scheduled_for:
             return
         
         # Generate content if needed
         if not post.content:
-            post.content = generate_content()
+            post.content = gpt.generate_content(
+                allow_cached=settings.GENERATION_CACHE_DEFAULT_PROMPT
+            )
         
         # Generate image if needed
-        if not post.image_url:
-            image_data = generate_image(post.content)
-            post.image_url = upload_to_s3(image_data, f"posts/{post_id}.jpg")
-        
-        # Update post status
-        post.status = 'scheduled'
-        db.commit()
-        
-        # Schedule the actual publishing
-        publish_post.apply_async(
-            args=[str(post.id)],
-            eta=post.scheduled_time
-        )
+        if not post.image_url and not post.media_urls:
+            post.image_url = generated_image_url(post.content)
+        
+        # Make sure Telegram gets the resized photo
+        replaced = []
+        if post.image_url and not post.thumbnail_url:
+            replaced = prepare_post_media(post)
+        
+        update_post(post.id, {
+            "content": post.content,
+            "image_url": post.image_url,
+            "thumbnail_url": post.thumbnail_url
+        })
+        for url in replaced:
+            release_blob(url)
+        
+        # Schedule the actual publishing; dispatch_due_posts picks it up
+        scheduler.schedule(str(post.id), post.scheduled_for)
     except Exception as e:
         logger.error(f"Error scheduling post: {e}")
-    finally:
-        db.close()
 
 @shared_task
 def publish_post(post_id: str):
-    db = SessionLocal()
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
-        if not post or post.status != 'scheduled':
+        # Claim the post first: a post dispatched twice (after a lapsed
+        # dispatch lease) is only ever sent by the worker that claimed it
+        if not PydanticObjectId.is_valid(post_id) or not update_post(
+            post_id,
+            {"status": PostStatus.PUBLISHING.value},
+            status=PostStatus.SCHEDULED
+        ):
             return
-        
-        channel = db.query(TelegramChannel).filter(TelegramChannel.id == post.channel_id).first()
-        if not channel or not channel.is_active:
-            post.status = 'failed'
-            db.commit()
+    except Exception as e:
+        logger.error(f"Error claiming post {post_id} for publishing: {e}")
+        return
+    
+    try:
+        post = load_post(post_id)
+        channel = run_async(ChannelDocument.get(post.channel.ref.id)) if post else None
+        if not channel:
+            update_post(post_id, {"status": PostStatus.FAILED.value})
             return
         
-        # Send message to Telegram
-        message_id = telegram_service.send_message(
-            channel_id=channel.channel_id,
-            text=post.content,
-            image_url=post.image_url
-        )
-        
-        # Update post status
-        post.status = 'published'
-        post.telegram_message_id = message_id
-        db.commit()
+        # Send message to Telegram; galleries go out as albums
+        chat_id = f"@{channel.username}"
+        if len(post.media_urls) > 1:
+            message_id = run_async(telegram_service.send_media_group(
+                channel_id=chat_id,
+                media_urls=post.media_urls,
+                text=post.content
+            ))
+        else:
+            message_id = run_async(telegram_service.send_message(
+                channel_id=chat_id,
+                text=post.content,
+                image_url=post.image_url or next(iter(post.media_urls), None)
+            ))
         
-        # Schedule metrics update
-        update_post_metrics.apply_async(
-            args=[str(post.id)],
-            countdown=3600  # Update after 1 hour
-        )
+        # Update post status; metrics are picked up by sweep_post_metrics
+        update_post(post_id, {
+            "status": PostStatus.PUBLISHED.value,
+            "telegram_message_id": message_id,
+            "published_at": datetime.utcnow()
+        })
     except Exception as e:
         logger.error(f"Error publishing post: {e}")
-        post.status = 'failed'
-        db.commit()
-    finally:
-        db.close()
+        update_post(post_id, {"status": PostStatus.FAILED.value})
+
+@shared_task
+def dispatch_due_posts():
+    """Hand posts whose time has come to the publish workers. Run every
+    few seconds by celery-beat."""
+    dispatched = 0
+    for _ in range(settings.SCHEDULER_MAX_BATCHES):
+        post_ids = scheduler.take_due(settings.SCHEDULER_BATCH_SIZE, settings.SCHEDULER_LEASE_SECONDS)
+        if not post_ids:
+            break
+        
+        for post_id in post_ids:
+            publish_post.delay(post_id)
+        # Leased posts that never get here are dispatched again once the
+        # lease runs out; publish_post skips posts that are not scheduled
+        scheduler.confirm_dispatched(post_ids)
+        dispatched += len(post_ids)
+        
+        if len(post_ids) < settings.SCHEDULER_BATCH_SIZE:
+            break
+    return dispatched
+
+def apply_post_metrics(post: PostDocument, stats: dict, now: datetime) -> tuple:
+    """Build the update storing fresh stats on a post and return it with
+    the rollup delta."""
+    current = {
+        "views": post.views_count,
+        "likes": post.likes_count,
+        "shares": post.shares_count,
+        "comments": post.comments_count,
+        "ctr": post.ctr
+    }
+    # A post enters the rollups with everything it has the first time its
+    # stats land, so the rollups add up to the post counters
+    is_new = post.metrics_recorded_at is None
+    fresh = {
+        **current,
+        "views": stats['views'],
+        "shares": stats['forwards'],
+        "comments": stats['replies']
+    }
+    
+    update = UpdateOne({"_id": post.id}, {"$set": {
+        "views_count": fresh["views"],
+        "shares_count": fresh["shares"],
+        "comments_count": fresh["comments"],
+        "metrics_recorded_at": now,
+        "updated_at": now
+    }})
+    return update, metrics_delta({} if is_new else current, fresh, is_new_post=is_new)
 
 @shared_task
 def update_post_metrics(post_id: str):
-    db = SessionLocal()
     try:
-        post = db.query(Post).filter(Post.id == post_id).first()
+        post = run_async(PostDocument.get(PydanticObjectId(post_id)))
         if not post or not post.telegram_message_id:
             return
-        
-        channel = db.query(TelegramChannel).filter(TelegramChannel.id == post.channel_id).first()
+    except Exception as e:
+        logger.error(f"Error updating post metrics: {e}")
+        return
+    
+    update_post_metrics_batch(str(post.channel.ref.id), [post_id])
+
+@shared_task
+def update_post_metrics_batch(channel_id: str, post_ids: list):
+    try:
+        channel = run_async(ChannelDocument.get(PydanticObjectId(channel_id)))
         if not channel:
             return
         
-        # Get message stats from Telegram
-        stats = telegram_service.get_channel_stats(
-            channel_id=channel.channel_id,
-            message_id=post.telegram_message_id
+        posts = run_async(PostDocument.find({
+            "_id": {"$in": [PydanticObjectId(post_id) for post_id in post_ids]},
+            "telegram_message_id": {"$ne": None}
+        }).to_list())
+        
+        # Fetch stats for the whole batch concurrently on the worker loop
+        all_stats = run_batch(
+            [
+                telegram_service.get_channel_stats(
+                    channel_id=f"@{channel.username}",
+                    message_id=post.telegram_message_id
+                )
+                for post in posts
+            ],
+            concurrency=settings.TELEGRAM_CONCURRENCY
         )
         
-        # Update metrics
-        metrics = db.query(PostMetrics).filter(PostMetrics.post_id == post.id).first()
-        if not metrics:
-            metrics = PostMetrics(post_id=post.id)
-            db.add(metrics)
+        now = datetime.utcnow()
+        updates, rollup_updates = [], []
+        for post, stats in zip(posts, all_stats):
+            if isinstance(stats, Exception):
+                logger.error(f"Error updating metrics for post {post.id}: {stats}")
+                continue
+            update, delta = apply_post_metrics(post, stats, now)
+            updates.append(update)
+            rollup_updates.append((post.created_at, delta))
+        if not updates:
+            return
         
-        metrics.views_count = stats['views']
-        metrics.shares_count = stats['forwards']
-        metrics.comments_count = stats['replies']
-        db.commit()
+        # The counters live on the post documents, which both the rollups
+        # and the aggregation fallback in metrics_pipelines agree with
+        run_async(PostDocument.get_motor_collection().bulk_write(updates, ordered=False))
+        run_async(record_metrics(str(channel.id), rollup_updates))
+        invalidate(channel_scope(channel.id))
+    except Exception as e:
+        logger.error(f"Error updating post metrics batch: {e}")
+
+def due_posts_filter(now: datetime) -> dict:
+    """Published posts whose refresh interval in METRICS_REFRESH_CURVE has
+    elapsed; posts never refreshed are due right away."""
+    due_bands = []
+    min_age = timedelta(0)
+    for max_age, interval in METRICS_REFRESH_CURVE:
+        due_bands.append({
+            "published_at": {"$gt": now - max_age, "$lte": now - min_age},
+            "$or": [
+                {"metrics_updated_at": None},
+                {"metrics_updated_at": {"$lte": now - interval}}
+            ]
+        })
+        min_age = max_age
+    
+    return {
+        "status": PostStatus.PUBLISHED.value,
+        "telegram_message_id": {"$ne": None},
+        "$or": due_bands
+    }
+
+async def claim_due_posts(now: datetime) -> list:
+    """Mark up to METRICS_SWEEP_LIMIT due posts, least recently refreshed
+    first, as refreshed at now and return their (post id, channel id)."""
+    collection = PostDocument.get_motor_collection()
+    # Ascending order puts posts never refreshed (null) first
+    due_posts = await collection.find(
+        due_posts_filter(now),
+        {"channel": 1}
+    ).sort("metrics_updated_at", ASCENDING).limit(settings.METRICS_SWEEP_LIMIT).to_list(length=None)
+    if not due_posts:
+        return []
+    
+    # Claim the posts before dispatching so that the next sweep does not
+    # pick them up again while their batches are still queued
+    await collection.update_many(
+        {"_id": {"$in": [post["_id"] for post in due_posts]}},
+        {"$set": {"metrics_updated_at": now}}
+    )
+    return [(str(post["_id"]), str(post["channel"].id)) for post in due_posts]
+
+@shared_task
+def sweep_post_metrics():
+    """Dispatch metrics refreshes for every post that is due according to
+    METRICS_REFRESH_CURVE, grouped by channel and spread over METRICS_SHARDS
+    queues. Run periodically by celery-beat."""
+    try:
+        due_posts = run_async(claim_due_posts(datetime.utcnow()))
+        if not due_posts:
+            return 0
         
-        # Schedule next update
-        update_post_metrics.apply_async(
-            args=[str(post.id)],
-            countdown=3600  # Update every hour
-        )
+        posts_by_channel = defaultdict(list)
+        for post_id, channel_id in due_posts:
+            posts_by_channel[channel_id].append(post_id)
+        
+        batch_size = settings.METRICS_BATCH_SIZE
+        for channel_id, post_ids in posts_by_channel.items():
+            queue = f"metrics-{metrics_shard(channel_id)}"
+            for i in range(0, len(post_ids), batch_size):
+                update_post_metrics_batch.apply_async(
+                    args=[channel_id, post_ids[i:i + batch_size]],
+                    queue=queue
+                )
+        
+        return len(due_posts)
     except Exception as e:
-        logger.error(f"Error updating post metrics: {e}")
-    finally:
-        db.close()
+        logger.error(f"Error sweeping post metrics: {e}")
 
 @shared_task
 def update_channel_metrics(channel_id: str):
-    db = SessionLocal()
     try:
-        channel = db.query(TelegramChannel).filter(TelegramChannel.id == channel_id).first()
-        if not channel or not channel.is_active:
+        if not PydanticObjectId.is_valid(channel_id):
+            return
+        channel = run_async(ChannelDocument.get(PydanticObjectId(channel_id)))
+        if not channel:
             return
         
-        # Get channel info from Telegram
-        channel_info = telegram_service.get_channel_info(channel.channel_id)
-        
-        # Update metrics
-        metrics = db.query(ChannelMetrics).filter(ChannelMetrics.channel_id == channel.id).first()
-        if not metrics:
-            metrics = ChannelMetrics(channel_id=channel.id)
-            db.add(metrics)
+        # Get the subscriber count from Telegram
+        subscribers = run_async(telegram_service.get_member_count(f"@{channel.username}"))
         
-        metrics.subscribers_count = channel_info.get('members_count', 0)
-        db.commit()
+        # Record a snapshot; the metrics API reads the latest one
+        run_async(ChannelMetrics(channel=channel, subscribers_count=subscribers).insert())
+        invalidate(channel_scope(channel.id))
         
         # Schedule next update
         update_channel_metrics.apply_async(
@@ -151,13 +335,108 @@ def update_channel_metrics(channel_id: str):
         )
     except Exception as e:
         logger.error(f"Error updating channel metrics: {e}")
-    finally:
-        db.close()
+
+def prepare_post_media(post: PostDocument) -> list:
+    """Replace the post image with a Telegram-ready JPEG and add a thumbnail.
+
+    Both are stripped of metadata and stored content-addressed, so posts
+    sharing an image share the processed files too. Returns the replaced
+    URLs, whose references the caller releases once the post is saved.
+    """
+    try:
+        key = key_from_url(post.image_url)
+        if key:
+            original = download_from_s3(key)
+        else:
+            response = requests.get(post.image_url, timeout=30)
+            response.raise_for_status()
+            original = response.content
+        if not original:
+            return []
+        
+        photo, photo_type = media.prepare_telegram_photo(original)
+        thumbnail, thumbnail_type = media.make_thumbnail(original)
+    except Exception as e:
+        # Keep the original image rather than failing the caller
+        logger.error(f"Error preparing media for post {post.id}: {e}")
+        return []
+    
+    image_url = upload_blob(photo, "jpg", content_type=photo_type)
+    thumbnail_url = upload_blob(thumbnail, "webp", content_type=thumbnail_type)
+    if not (image_url and thumbnail_url):
+        release_blob(image_url)
+        release_blob(thumbnail_url)
+        return []
+    
+    replaced = [post.image_url, post.thumbnail_url]
+    post.image_url = image_url
+    post.thumbnail_url = thumbnail_url
+    return replaced
+
+@shared_task
+def process_post_media(post_id: str):
+    try:
+        post = load_post(post_id)
+        if not post or not post.image_url:
+            return
+        
+        image_url = post.image_url
+        replaced = prepare_post_media(post)
+        if not replaced:
+            return
+        
+        # Only replace the image this task processed: another upload may
+        # have landed in the meantime and released it already
+        if run_async(PostDocument.get_motor_collection().update_one(
+            {"_id": post.id, "image_url": image_url},
+            {"$set": {
+                "image_url": post.image_url,
+                "thumbnail_url": post.thumbnail_url,
+                "updated_at": datetime.utcnow()
+            }}
+        )).matched_count:
+            released = replaced
+        else:
+            released = [post.image_url, post.thumbnail_url]
+        for url in released:
+            release_blob(url)
+    except Exception as e:
+        logger.error(f"Error processing post media: {e}")
+
+def generated_image_url(prompt: str) -> str:
+    """Generate an image for the prompt and upload it to S3, reusing the
+    uploaded image of an identical earlier prompt.
+
+    Cache entries hold no reference of their own, so an image is deleted
+    once no post uses it; the caller always gets a reference.
+    """
+    params = gpt.image_params(prompt)
+    uploaded = []
+    
+    def _generate():
+        image_data = gpt.generate_image(prompt)
+        image_url = upload_blob(image_data, "jpg") if image_data else ""
+        uploaded.append(image_url)
+        return image_url
+    
+    for _ in range(2):
+        image_url = gpt.cached_generation("image", params, _generate)
+        if uploaded:
+            # Our own upload: its reference is ours
+            return image_url
+        if not image_url:
+            return ""
+        image_url = retain_blob(image_url)
+        if image_url:
+            return image_url
+        # The cached image was deleted after its last post released it
+        gpt.forget_generation("image", params)
+    return _generate()
 
 @shared_task
 def generate_content(prompt: str = None) -> str:
     try:
-        return generate_content(prompt)
+        return gpt.generate_content(prompt)
     except Exception as e:
         logger.error(f"Error generating content: {e}")
         return ""
@@ -165,8 +444,135 @@ def generate_content(prompt: str = None) -> str:
 @shared_task
 def generate_image(prompt: str) -> str:
     try:
-        image_data = generate_image(prompt)
-        return upload_to_s3(image_data, f"generated/{datetime.now().isoformat()}.jpg")
+        return generated_image_url(prompt)
     except Exception as e:
         logger.error(f"Error generating image: {e}")
-        return "" 
\ No newline at end of file
+        return "" 
+
+@shared_task
+def generate_post_content(job_id: str, post_id: str, prompt: str = None):
+    update_job(job_id, "running")
+    try:
+        # Check the post before paying for the generation
+        if not load_post(post_id):
+            update_job(job_id, "failed", error="Post not found")
+            return
+        
+        content = gpt.generate_content(prompt)
+        if not content:
+            update_job(job_id, "failed", error="Failed to generate content")
+            return
+        
+        if not update_post(post_id, {"content": content}):
+            update_job(job_id, "failed", error="Post not found")
+            return
+        update_job(job_id, "succeeded", result={"content": content})
+    except Exception as e:
+        logger.error(f"Error generating post content: {e}")
+        update_job(job_id, "failed", error="Failed to generate content")
+
+@shared_task
+def generate_post_image(job_id: str, post_id: str, prompt: str = None):
+    update_job(job_id, "running")
+    try:
+        post = load_post(post_id)
+        if not post:
+            update_job(job_id, "failed", error="Post not found")
+            return
+        
+        image_url = generated_image_url(prompt or post.content)
+        if not image_url:
+            update_job(job_id, "failed", error="Failed to generate image")
+            return
+        
+        replaced = [post.image_url, post.thumbnail_url]
+        post.image_url = image_url
+        post.thumbnail_url = None
+        # The generated image, once the processed one replaces it
+        generated = prepare_post_media(post)
+        if not update_post(post_id, {"image_url": post.image_url, "thumbnail_url": post.thumbnail_url}):
+            for url in [post.image_url, post.thumbnail_url, *generated]:
+                release_blob(url)
+            update_job(job_id, "failed", error="Post not found")
+            return
+        for url in replaced + generated:
+            release_blob(url)
+        update_job(job_id, "succeeded", result={"image_url": post.image_url})
+    except Exception as e:
+        logger.error(f"Error generating post image: {e}")
+        update_job(job_id, "failed", error="Failed to generate image")
+
+@shared_task
+def generate_content_bulk(job_id: str, items: list):
+    """Generate content for many posts within the GPT request/token budgets,
+    reporting progress on the job and writing results in batches."""
+    update_job(job_id, "running", total=len(items), completed=0, failed=0)
+    pending = []
+    errors = []
+    completed = 0
+    
+    async def flush():
+        if pending:
+            now = datetime.utcnow()
+            await PostDocument.get_motor_collection().bulk_write([
+                UpdateOne(
+                    {"_id": PydanticObjectId(post_id)},
+                    {"$set": {"content": content, "updated_at": now}}
+                )
+                for post_id, content in pending
+            ], ordered=False)
+            pending.clear()
+    
+    async def generate(item, semaphore):
+        async with semaphore:
+            try:
+                # The shared GPT budget paces every worker and API process
+                return item, await gpt.agenerate_content(item.get("prompt"))
+            except Exception as e:
+                logger.error(f"Error generating content for post {item['post_id']}: {e}")
+                return item, ""
+    
+    async def run():
+        nonlocal completed
+        semaphore = asyncio.Semaphore(settings.GPT_BULK_CONCURRENCY)
+        for future in asyncio.as_completed([generate(item, semaphore) for item in items]):
+            item, content = await future
+            if content:
+                completed += 1
+                pending.append((item["post_id"], content))
+                if len(pending) >= settings.GPT_BULK_WRITE_BATCH:
+                    await flush()
+            else:
+                errors.append({"post_id": item["post_id"], "error": "Failed to generate content"})
+            update_job(job_id, "running", completed=completed, failed=len(errors))
+        await flush()
+    
+    try:
+        run_async(run())
+        update_job(
+            job_id,
+            "succeeded",
+            result={"completed": completed, "errors": errors},
+            completed=completed,
+            failed=len(errors)
+        )
+    except Exception as e:
+        logger.error(f"Error in bulk content generation: {e}")
+        update_job(job_id, "failed", error="Bulk generation failed", completed=completed, failed=len(errors))
+
+@shared_task(bind=True, max_retries=settings.EMAIL_MAX_RETRIES)
+def send_emails(self, emails: list):
+    """Deliver a batch of emails, retrying temporary failures with backoff."""
+    if not email_service.smtp_configured():
+        logger.warning(f"SMTP is not configured, dropping {len(emails)} emails")
+        return
+    
+    failed = run_async(email_service.send_emails(emails))
+    if failed:
+        countdown = min(settings.EMAIL_RETRY_BACKOFF_SECONDS * 2 ** self.request.retries, 3600)
+        raise self.retry(args=[failed], countdown=countdown)
+
+def queue_emails(emails: list):
+    """Hand emails to the workers in batches of EMAIL_BATCH_SIZE."""
+    for start in range(0, len(emails), settings.EMAIL_BATCH_SIZE):
+        send_emails.delay(emails[start:start + settings.EMAIL_BATCH_SIZE])
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Проверяет индексы MongoDB без их создания и показывает,
+какие индексы используют основные запросы (по данным explain()).
+"""
+
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.mongodb import init_mongodb
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(init_mongodb(index_mode="verify"))
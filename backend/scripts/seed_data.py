@@ -16,7 +16,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from app.core.config import settings
-from app.core.mongodb import init_mongodb
+from app.core.mongodb import init_mongodb, close_mongodb
 from app.core.security import get_password_hash
 from app.models.mongodb import User, Channel, Post, ChannelMetrics, PostStatus
 
@@ -122,6 +122,7 @@ async def create_test_data():
                 shares_count=shares,
                 ctr=ctr,
                 revenue=revenue,
+                metrics_recorded_at=published_at,
                 
                 # Даты
                 scheduled_for=scheduled_for,
@@ -159,5 +160,11 @@ async def create_test_data():
     print(f"Логин для тестового пользователя: test@example.com / password123")
     print(f"Логин для администратора: admin@example.com / admin123")
 
+async def main():
+    try:
+        await create_test_data()
+    finally:
+        close_mongodb()
+
 if __name__ == "__main__":
-    asyncio.run(create_test_data()) 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,4 @@
+import os
+
+# aiogram validates the token format when app.services.telegram is imported
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TEST")
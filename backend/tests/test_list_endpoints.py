@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+from beanie import PydanticObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import channels, posts
+from app.core.auth import get_current_user
+from app.schemas.auth import CurrentUser
+
+USER_ID = PydanticObjectId()
+NOW = datetime(2024, 1, 1, 12, 0)
+
+POST = {
+    "_id": PydanticObjectId(),
+    "channel": PydanticObjectId(),
+    "title": "Post",
+    "description": None,
+    "content": "Content",
+    "status": "scheduled",
+    "media_urls": [],
+    "views_count": 3,
+    "likes_count": 0,
+    "comments_count": 0,
+    "shares_count": 0,
+    "scheduled_for": NOW,
+    "published_at": None,
+    "created_at": NOW,
+    "updated_at": NOW,
+}
+
+CHANNEL = {
+    "_id": PydanticObjectId(),
+    "username": "channel",
+    "category": "news",
+    "description": None,
+    "is_monetized": False,
+    "created_at": NOW,
+    "updated_at": NOW,
+}
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(posts.router, prefix="/posts")
+    app.include_router(channels.router, prefix="/channels")
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+        id=str(USER_ID),
+        email="user@example.com",
+        is_active=True
+    )
+    return TestClient(app)
+
+def fake_paginate(document, projections):
+    async def paginate(model, filters, field, limit, cursor=None, direction=None, projection=None):
+        projections.append(projection)
+        # Mongo only returns the projected paths
+        paths = projection.Settings.projection
+        return [projection.model_validate({k: v for k, v in document.items() if k in paths})], None
+    return paginate
+
+@pytest.mark.parametrize("fields", [None, "title,views_count,channel_id"])
+def test_list_posts(client, monkeypatch, fields):
+    projections = []
+    monkeypatch.setattr(posts, "paginate", fake_paginate(POST, projections))
+    
+    response = client.get("/posts/", params={"fields": fields} if fields else {})
+    
+    assert response.status_code == 200
+    item = response.json()["items"][0]
+    assert item["id"] == str(POST["_id"])
+    assert item["channel_id"] == str(POST["channel"])
+    assert "content" not in item
+    assert set(projections[0].Settings.projection) >= {"_id", "channel", "scheduled_for", "updated_at"}
+    if fields:
+        assert item["views_count"] == 3
+
+@pytest.mark.parametrize("fields", [None, "username,is_monetized"])
+def test_list_channels(client, monkeypatch, fields):
+    projections = []
+    monkeypatch.setattr(channels, "paginate", fake_paginate(CHANNEL, projections))
+    
+    response = client.get("/channels/", params={"fields": fields} if fields else {})
+    
+    assert response.status_code == 200
+    item = response.json()["items"][0]
+    assert item["id"] == str(CHANNEL["_id"])
+    assert item["username"] == "channel"
+    assert "description" not in item
+    assert set(projections[0].Settings.projection) >= {"_id", "created_at", "updated_at"}
+    if fields:
+        assert item["is_monetized"] is False
+
+def test_list_posts_rejects_unknown_fields(client):
+    response = client.get("/posts/", params={"fields": "title,secret"})
+    
+    assert response.status_code == 400